@@ -2,47 +2,119 @@ import anthropic
 import re
 from utils import logger
 
+# Static system prompts, sent as system blocks ahead of the per-post content.
+# Claude only caches prefixes of at least 1024 tokens (Opus and Sonnet), so the
+# breakpoint on the summarization prompt only takes effect once the prompt grows
+# past that; shorter prompts are sent uncached at the normal input price.
+SUMMARIZE_SYSTEM_PROMPT = """You are a professional writer who specializes in technical content summarization, particularly for GIS and geospatial technology. You excel at distilling complex content into clear, objective summaries. Always think before you write, think out loud using the <THINKING> xml tags.
+
+The content you are reading will always be contained in the <POST> xml tags.
+
+Return only your summary in <SUMMARY> xml tags.
+
+For every post, provide a comprehensive, objective summary that captures the key technical information, announcements, features, and updates described in the post."""
+
+COMPREHENSIVE_SYSTEM_PROMPT = """You are a professional technical writer specializing in GIS and Esri technology. You write clear, engaging blog posts that highlight the most critical developments in the Esri ecosystem. Your audience is technical professionals who use Esri products. You work for Dymaptic, a small consulting firm specializing in GIS solutions. We always write blogs in the tone of your local GIS professional who is excited to help you out! Always think before you write; think out loud using the <THINKING> XML tags. Ensure you include a brief introduction about overall trends or themes you notice in the posts. Include a good hook at the beginning to grab the reader's attention. Always provide links to the posts you are summarizing.
+
+For each post, explain why it's significant and what readers should know about it. Start with a brief introduction about overall trends or themes you notice."""
+
+# Post content beyond this many characters is never sent to Claude
+MAX_POST_CHARS = 100000
+
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
 class AIInterface:
     def __init__(self, api_key, model="claude-3-opus-20240229"):
         self.model = model
         self.client = anthropic.Anthropic(api_key=api_key)
+        self.usage = {field: 0 for field in USAGE_FIELDS}
+        self.usage["requests"] = 0
+
+    def build_system(self, system_prompt, cache=True):
+        """Build a system parameter, with a cache breakpoint on the static prompt if cache is set"""
+        block = {"type": "text", "text": system_prompt}
+        if cache:
+            block["cache_control"] = {"type": "ephemeral"}
+        return [block]
+
+    def build_summarize_request(self, blog_content, title, url):
+        """Build the Messages API parameters for a single blog summarization"""
+        user_content = f"""Here is the blog post content:
+<POST>
+Title: {title}
+URL: {url}
+
+{blog_content[:MAX_POST_CHARS]}
+</POST>"""
+
+        return {
+            "model": self.model,
+            "max_tokens": 1000,
+            "temperature": 0.0,
+            "system": self.build_system(SUMMARIZE_SYSTEM_PROMPT),
+            "messages": [
+                {"role": "user", "content": user_content}
+            ]
+        }
 
     def summarize_blog(self, blog_content, title, url):
         """Send blog content to Claude for generic summarization"""
         try:
-            prompt = f"""
-            SYSTEM:
-            You are a professional writer who specializes in technical content summarization, particularly for GIS and geospatial technology. You excel at distilling complex content into clear, objective summaries. Always think before you write, think out loud using the <THINKING> xml tags. 
-
-            The content you are reading will always be contained in the <POST> xml tags.
-
-            Return only your summary in <SUMMARY> xml tags.
-
-            USER:
-            Here is the blog post content:
-            <POST>
-            Title: {title}
-            URL: {url}
-
-            {blog_content[:100000]}
-            </POST>
-
-            Provide a comprehensive, objective summary that captures the key technical information, announcements, features, and updates described in this post.
-            """
-
             response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1000,
-                temperature=0.0,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                **self.build_summarize_request(blog_content, title, url)
             )
+            self.record_usage(response)
 
             return self._parse_ai_response(response.content[0].text)
         except Exception as e:
             logger.error(f"Error in AI summarization: {e}")
-            return "Error generating summary: " + str(e)
+            # Raise rather than return an error string that would be stored as a summary
+            raise
+
+    def _batches(self):
+        """Return the Message Batches resource (GA in newer SDKs, beta in older ones)"""
+        batches = getattr(self.client.messages, "batches", None)
+        if batches is None:
+            batches = self.client.beta.messages.batches
+        return batches
+
+    def build_batch_request(self, custom_id, post):
+        """Build one Message Batch request summarizing a post with content, title and url"""
+        return {
+            "custom_id": custom_id,
+            "params": self.build_summarize_request(post["content"], post["title"], post["url"])
+        }
+
+    def submit_summary_batch(self, requests):
+        """Submit summarization requests from build_batch_request as a single Message Batch
+
+        Returns the batch ID.
+        """
+        batch = self._batches().create(requests=requests)
+        logger.info(f"Submitted message batch {batch.id} with {len(requests)} requests")
+        return batch.id
+
+    def get_batch_status(self, batch_id):
+        """Return the processing status of a Message Batch"""
+        batch = self._batches().retrieve(batch_id)
+        return batch.processing_status
+
+    def get_batch_summaries(self, batch_id):
+        """Collect parsed summaries from a finished Message Batch, keyed by custom_id"""
+        summaries = {}
+        for entry in self._batches().results(batch_id):
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                self.record_usage(message)
+                summaries[entry.custom_id] = self._parse_ai_response(message.content[0].text)
+            else:
+                logger.error(f"Batch request {entry.custom_id} did not succeed: {entry.result.type}")
+        return summaries
 
     def generate_comprehensive_summary(self, relevant_posts, query_text):
         """Generate a comprehensive summary of multiple blog posts relevant to the query"""
@@ -52,36 +124,57 @@ class AIInterface:
                 f"Title: {post.get('title', 'No Title')}\n"
                 f"Date: {post.get('date', 'No Date')}\n"
                 f"Similarity: {post.get('similarity_score', 0):.4f}\n"
-                f"Summary: {post.get('summary', 'No Summary')}"
+                + (f"Topic group: {post['topic']}\n" if post.get('topic') else "")
+                + f"Summary: {post.get('summary', 'No Summary')}"
                 for post in relevant_posts
             ])
 
-            prompt = f"""
-            SYSTEM:
-            You are a professional technical writer specializing in GIS and Esri technology. You write clear, engaging blog posts that highlight the most critical developments in the Esri ecosystem. Your audience is technical professionals who use Esri products. You work for Dymaptic, a small consulting firm specializing in GIS solutions. We always write blogs in the tone of your local GIS professional who is excited to help you out! Always think before you write; think out loud using the <THINKING> XML tags. Ensure you include a brief introduction about overall trends or themes you notice in the posts. Include a good hook at the beginning to grab the reader's attention. Always provide links to the posts you are summarizing.
+            user_content = f"""Write a blog post summarizing these {len(relevant_posts)} most relevant Esri blog posts related to: "{query_text}".
 
-            USER:
-            Write a blog post summarizing these {len(relevant_posts)} most relevant Esri blog posts related to: "{query_text}". For each post, explain why it's significant and what readers should know about it. Start with a brief introduction about overall trends or themes you notice.
+Here are the posts to summarize:
 
-            Here are the posts to summarize:
-
-            {posts_content}
-            """
+{posts_content}"""
 
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=2000,
                 temperature=0.2,
+                # Runs once per command, so a cache write would never be read back
+                system=self.build_system(COMPREHENSIVE_SYSTEM_PROMPT, cache=False),
                 messages=[
-                    {"role": "user", "content": prompt}
+                    {"role": "user", "content": user_content}
                 ]
             )
+            self.record_usage(response)
 
             return response.content[0].text
         except Exception as e:
             logger.error(f"Error generating comprehensive summary: {e}")
             return f"Error generating comprehensive summary: {e}"
 
+    def record_usage(self, response):
+        """Accumulate token usage, including prompt cache reads and writes, from a response"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return {}
+
+        call_usage = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+        for field, value in call_usage.items():
+            self.usage[field] += value
+        self.usage["requests"] += 1
+
+        logger.info(
+            f"Token usage: input={call_usage['input_tokens']} "
+            f"output={call_usage['output_tokens']} "
+            f"cache_write={call_usage['cache_creation_input_tokens']} "
+            f"cache_read={call_usage['cache_read_input_tokens']}"
+        )
+        return call_usage
+
+    def get_usage(self):
+        """Return accumulated token usage for this interface"""
+        return dict(self.usage)
+
     def _parse_ai_response(self, response):
         """Parse XML tags from AI response to extract summary"""
         try:
@@ -0,0 +1,216 @@
+# batch_processor.py
+import hashlib
+import json
+import os
+import time
+from utils import logger
+
+class BatchProcessor:
+    """Summarize many blog posts through the Message Batches API, resumable across restarts
+
+    Posts are split over as many batches as the API's per-batch request and
+    size limits require; all of their IDs are persisted in the state file.
+    """
+
+    def __init__(self, ai_interface, embedding_service, data_store, content_processor,
+                 state_file, poll_interval=60, max_batch_requests=100000, max_batch_bytes=200 * 1024 * 1024,
+                 embedding_batch_size=50, lexical_index=None, ledger=None):
+        self.ai_interface = ai_interface
+        self.embedding_service = embedding_service
+        self.data_store = data_store
+        self.content_processor = content_processor
+        self.state_file = state_file
+        self.poll_interval = poll_interval
+        self.max_batch_requests = max_batch_requests
+        self.max_batch_bytes = max_batch_bytes
+        self.embedding_batch_size = embedding_batch_size
+        self.lexical_index = lexical_index
+        self.ledger = ledger
+
+    def make_custom_id(self, url):
+        """Build a batch custom_id for a URL (the API limits IDs to 64 safe characters)"""
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def load_state(self):
+        """Load the persisted in-flight batches, if any"""
+        try:
+            if os.path.exists(self.state_file) and os.path.getsize(self.state_file) > 0:
+                with open(self.state_file, 'r') as f:
+                    state = json.load(f)
+                # State files from before batches were split hold a single batch_id
+                if "batch_id" in state:
+                    batch_id = state.pop("batch_id")
+                    state["batch_ids"] = [batch_id] if batch_id else []
+                return state
+            return None
+        except Exception as e:
+            logger.error(f"Error loading batch state: {e}")
+            return None
+
+    def save_state(self, state):
+        """Persist the in-flight batches so a restarted run can resume polling them"""
+        with open(self.state_file, 'w') as f:
+            json.dump(state, f, indent=2)
+
+    def clear_state(self):
+        """Remove the persisted batches once their results are stored"""
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+    def split_requests(self, requests):
+        """Split batch requests into chunks within the per-batch request count and size limits"""
+        chunks = []
+        chunk, chunk_bytes = [], 0
+        for request in requests:
+            size = len(json.dumps(request).encode('utf-8'))
+            if chunk and (len(chunk) >= self.max_batch_requests or chunk_bytes + size > self.max_batch_bytes):
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append(request)
+            chunk_bytes += size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def submit(self, urls):
+        """Prepare the given URLs and submit the ones still needing a summary as message batches
+
+        Posts checkpointed in the ingest ledger are not fetched again, and
+        posts that already have a summary skip the batch and wait only for
+        embedding. Returns the persisted state, or None if there is nothing to do.
+        """
+        posts = {}
+        summarized = {}
+        for url in urls:
+            custom_id = self.make_custom_id(url)
+            entry = self.ledger.get(url) if self.ledger else {}
+            if entry.get("prepared") and entry.get("summary"):
+                summarized[custom_id] = {"prepared": entry["prepared"], "summary": entry["summary"]}
+                continue
+            if entry.get("prepared"):
+                posts[custom_id] = entry["prepared"]
+                continue
+
+            try:
+                prepared = self.content_processor.prepare_blog(url)
+                if not prepared:
+                    raise Exception("Could not fetch or extract content")
+                posts[custom_id] = prepared
+                if self.ledger:
+                    self.ledger.mark(url, "fetched", save=False, prepared=prepared)
+            except Exception as e:
+                logger.error(f"Error preparing blog {url}: {str(e)}")
+                if self.ledger:
+                    self.ledger.mark_failed(url, str(e), save=False)
+        if self.ledger:
+            self.ledger.save()
+
+        if not posts and not summarized:
+            logger.warning("No posts to submit for batch summarization")
+            return None
+        if summarized:
+            logger.info(f"{len(summarized)} posts already have summaries and only need embedding")
+
+        state = {"batch_ids": [], "posts": posts, "summarized": summarized}
+        requests = [self.ai_interface.build_batch_request(custom_id, post) for custom_id, post in posts.items()]
+        chunks = self.split_requests(requests)
+        for i, chunk in enumerate(chunks):
+            try:
+                state["batch_ids"].append(self.ai_interface.submit_summary_batch(chunk))
+            except Exception as e:
+                if not state["batch_ids"]:
+                    raise
+                # Keep the batches already submitted; the rest fail and are retried from their checkpoints
+                unsubmitted = sum(len(rest) for rest in chunks[i:])
+                logger.error(f"Error submitting a message batch; {unsubmitted} posts will be retried later: {e}")
+                break
+            # Saved after every submission so a crash never orphans a submitted batch
+            self.save_state(state)
+        if not chunks:
+            self.save_state(state)
+        return state
+
+    def wait_for_batch(self, batch_id):
+        """Poll until the batch has finished processing"""
+        while True:
+            status = self.ai_interface.get_batch_status(batch_id)
+            if status == "ended":
+                logger.info(f"Message batch {batch_id} has ended")
+                return
+            logger.info(f"Message batch {batch_id} is {status}; checking again in {self.poll_interval}s")
+            time.sleep(self.poll_interval)
+
+    def store_results(self, state):
+        """Embed the batch summaries in bulk and store the completed records
+
+        Posts whose summarization or embedding failed are recorded in the
+        ingest ledger with their intermediate results, so a later run retries
+        only the stage that failed.
+        """
+        summaries = {}
+        for batch_id in state["batch_ids"]:
+            summaries.update(self.ai_interface.get_batch_summaries(batch_id))
+        completed = []
+        for custom_id, prepared in state["posts"].items():
+            if custom_id in summaries:
+                completed.append((prepared, summaries[custom_id]))
+                if self.ledger:
+                    self.ledger.mark(prepared["url"], "summarized", save=False,
+                                     prepared=prepared, summary=summaries[custom_id])
+            elif self.ledger:
+                self.ledger.mark_failed(prepared["url"], "Batch summarization request did not succeed",
+                                        save=False, prepared=prepared)
+        completed.extend((item["prepared"], item["summary"]) for item in state.get("summarized", {}).values())
+        if self.ledger:
+            self.ledger.save()
+        if not completed:
+            logger.warning(f"No successful summaries in batches {state['batch_ids']}")
+            return 0
+
+        try:
+            embeddings, model = self.embedding_service.batch_generate_embeddings(
+                [summary for _, summary in completed],
+                batch_size=self.embedding_batch_size
+            )
+        except Exception as e:
+            if not self.ledger:
+                raise
+            for prepared, summary in completed:
+                self.ledger.mark_failed(prepared["url"], str(e), save=False, prepared=prepared, summary=summary)
+            self.ledger.save()
+            return 0
+
+        records = [
+            self.content_processor.build_record(prepared, summary, embedding, model)
+            for (prepared, summary), embedding in zip(completed, embeddings)
+        ]
+        if not self.data_store.save_many_blog_data(records):
+            raise Exception(f"Failed to store results of batches {state['batch_ids']}")
+
+        if self.lexical_index is not None:
+            for record in records:
+                self.lexical_index.add_document(record)
+            self.lexical_index.save()
+        if self.ledger:
+            for record in records:
+                self.ledger.mark(record["url"], "embedded", save=False)
+            self.ledger.save()
+        return len(records)
+
+    def run(self, urls):
+        """Resume persisted batches or submit new ones, then store their results"""
+        state = self.load_state()
+        if state:
+            logger.info(f"Resuming message batches {state['batch_ids']}")
+        else:
+            state = self.submit(urls)
+            if not state:
+                return 0
+
+        for batch_id in state["batch_ids"]:
+            self.wait_for_batch(batch_id)
+        stored = self.store_results(state)
+        self.clear_state()
+
+        logger.info(f"Stored {stored} blog posts from {len(state['batch_ids'])} message batches")
+        return stored
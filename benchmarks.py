@@ -0,0 +1,185 @@
+# benchmarks.py
+import argparse
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+def synthetic_records(size, dim=1024, seed=0):
+    """Generate synthetic posts with realistic field lengths"""
+    rng = np.random.default_rng(seed)
+    words = ["arcgis", "imagery", "release", "map", "viewer", "sdk", "layer", "raster",
+             "enterprise", "online", "pro", "field", "data", "analysis", "scene"]
+    random.seed(seed)
+
+    def text(length):
+        out, total = [], 0
+        while total < length:
+            word = random.choice(words)
+            out.append(word)
+            total += len(word) + 1
+        return " ".join(out)[:length]
+
+    return [
+        {
+            "url": f"https://www.esri.com/arcgis-blog/products/bench/post-{i}/",
+            "title": f"Benchmark post {i}",
+            "date": f"2024-{(i % 12) + 1:02d}-15",
+            "content": text(5000),
+            "summary": text(1500),
+            "embedding": rng.standard_normal(dim).tolist(),
+            "embeddingModel": "bench",
+            "processedDate": "2024-12-01T00:00:00"
+        }
+        for i in range(size)
+    ]
+
+def build_corpus(storage_file, size, dim=1024, seed=0):
+    """Write a synthetic corpus of the given size"""
+    from data_store import DataStore
+
+    DataStore(storage_file).save_many_blog_data(synthetic_records(size, dim=dim, seed=seed))
+
+def read_memory_status():
+    """Return (peak RSS, anonymous RSS) in MB from /proc/self/status"""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            field, _, rest = line.partition(":")
+            if field in ("VmHWM", "RssAnon"):
+                values[field] = int(rest.split()[0]) / 1024
+    return values.get("VmHWM", 0.0), values.get("RssAnon", 0.0)
+
+def run_search_worker(storage_file, mode, top_n, dim):
+    """Run one query in this process and print its memory use"""
+    from data_store import DataStore
+    from similarity_engine import SimilarityEngine
+
+    store = DataStore(storage_file)
+    query = np.random.default_rng(1).standard_normal(dim)
+
+    if mode == "eager":
+        # The previous approach: materialize every record, then score it
+        posts = store.load_all_data()
+        engine = SimilarityEngine(store)
+        scores = [engine.calculate_cosine_similarity(query, post["embedding"]) for post in posts]
+        top = sorted(range(len(posts)), key=lambda i: scores[i], reverse=True)[:top_n]
+        results = [posts[i] for i in top]
+    else:
+        results = SimilarityEngine(store).find_similar_posts(query, top_n=top_n)
+
+    peak, anon = read_memory_status()
+    print(f"{len(results)} {peak:.1f} {anon:.1f}")
+
+def bench_search_memory(sizes, top_n=10, dim=1024):
+    """Report query memory use against corpus size for eager and lazy search"""
+    print(f"{'posts':>8} {'eager peak MB':>14} {'eager anon MB':>14} {'lazy peak MB':>13} {'lazy anon MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            storage_file = os.path.join(tmp, f"corpus_{size}.json")
+            build_corpus(storage_file, size, dim=dim)
+
+            row = [f"{size:>8}"]
+            for mode in ("eager", "lazy"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "search-memory", "--worker", storage_file,
+                     "--mode", mode, "--top", str(top_n), "--dim", str(dim)],
+                    capture_output=True, text=True, check=True
+                ).stdout.split()
+                row.append(f"{float(output[1]):>14.1f} {float(output[2]):>14.1f}")
+            print(" ".join(row))
+
+def bench_lexical_latency(sizes, top_n=10, repeats=50):
+    """Report BM25 index size and query latency against corpus size"""
+    from lexical_index import LexicalIndex, decode_postings
+
+    queries = ["arcgis pro release", "imagery raster analysis", "enterprise sdk", "scene viewer layer", "map"]
+    print(f"{'posts':>8} {'postings KB':>12} {'raw KB':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            index_dir = os.path.join(tmp, f"index_{size}")
+            index = LexicalIndex(index_dir)
+            for post in synthetic_records(size, dim=1):
+                index.add_document(post)
+            index.save()
+
+            # Reload so queries read postings the way a fresh process does
+            index = LexicalIndex(index_dir)
+            pairs = sum(len(decode_postings(index.get_postings_bytes(term))) for term in index.lexicon)
+
+            timings = []
+            for _ in range(repeats):
+                for query in queries:
+                    start = time.perf_counter()
+                    index.search(query, top_n=top_n)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+
+            print(f"{size:>8} {len(index.postings_data) / 1024:>12.1f} {pairs * 8 / 1024:>8.1f} "
+                  f"{timings[len(timings) // 2]:>8.2f} {timings[int(len(timings) * 0.95)]:>8.2f}")
+
+def bench_diversify_latency(sizes, top_n=10, dim=1024, clusters=4, repeats=20):
+    """Report MMR re-ranking and k-means grouping latency against candidate count"""
+    from sklearn.cluster import KMeans
+    from similarity_engine import maximal_marginal_relevance
+
+    rng = np.random.default_rng(0)
+    print(f"{'candidates':>10} {'mmr ms':>8} {'kmeans ms':>10}")
+    for size in sizes:
+        vectors = rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        relevance = np.sort(rng.random(size))[::-1]
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            selected = maximal_marginal_relevance(relevance, vectors @ vectors.T, top_n, duplicate_threshold=0.94)
+        mmr_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            KMeans(n_clusters=clusters, n_init=10, random_state=0).fit_predict(vectors[selected])
+        kmeans_ms = (time.perf_counter() - start) * 1000 / repeats
+
+        print(f"{size:>10} {mmr_ms:>8.2f} {kmeans_ms:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local performance benchmarks")
+    subparsers = parser.add_subparsers(dest="command", help="Benchmark to run")
+
+    memory_parser = subparsers.add_parser("search-memory", help="Query memory use against corpus size")
+    memory_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    memory_parser.add_argument("--top", type=int, default=10)
+    memory_parser.add_argument("--dim", type=int, default=1024)
+    memory_parser.add_argument("--worker", help=argparse.SUPPRESS)
+    memory_parser.add_argument("--mode", choices=["eager", "lazy"], default="lazy", help=argparse.SUPPRESS)
+
+    lexical_parser = subparsers.add_parser("lexical-latency", help="BM25 index size and query latency against corpus size")
+    lexical_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    lexical_parser.add_argument("--top", type=int, default=10)
+
+    diversify_parser = subparsers.add_parser("diversify-latency", help="MMR and k-means latency against candidate count")
+    diversify_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000])
+    diversify_parser.add_argument("--top", type=int, default=10)
+    diversify_parser.add_argument("--dim", type=int, default=1024)
+
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.command == "search-memory":
+        if args.worker:
+            run_search_worker(args.worker, args.mode, args.top, args.dim)
+        else:
+            bench_search_memory(args.sizes, top_n=args.top, dim=args.dim)
+    elif args.command == "lexical-latency":
+        bench_lexical_latency(args.sizes, top_n=args.top)
+    elif args.command == "diversify-latency":
+        bench_diversify_latency(args.sizes, top_n=args.top, dim=args.dim)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,37 @@
 import os
+import requests
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from email.utils import parsedate_to_datetime
 from utils import logger, validate_url
 
+def parse_feed_date(text):
+    """Parse a sitemap lastmod or feed date into a naive local ISO timestamp, or None"""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+def local_name(tag):
+    """Strip the XML namespace from an element tag"""
+    return tag.rsplit("}", 1)[-1]
+
+def child_text(element, name):
+    """Return the text of an element's first child with the given local name"""
+    for child in element:
+        if local_name(child.tag) == name:
+            return (child.text or "").strip() or child.get("href")
+    return None
+
 class BlogSourceHandler:
     def __init__(self, source_file):
         self.source_file = source_file
@@ -32,3 +63,65 @@ class BlogSourceHandler:
         except Exception as e:
             logger.error(f"Error loading URLs: {e}")
             return []
+
+    def add_urls(self, urls):
+        """Append URLs that are not already in the source file, returning the ones added"""
+        existing = set(self.load_urls())
+        added = [url for url in dict.fromkeys(urls) if url not in existing and validate_url(url)]
+        if added:
+            needs_newline = False
+            if os.path.exists(self.source_file) and os.path.getsize(self.source_file) > 0:
+                with open(self.source_file, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+            with open(self.source_file, 'a') as f:
+                # Never glue the first new URL onto an unterminated last line
+                if needs_newline:
+                    f.write("\n")
+                for url in added:
+                    f.write(url + "\n")
+            logger.info(f"Added {len(added)} new URLs to {self.source_file}")
+        return added
+
+    def discover_urls(self, feed_urls, url_prefix=None, max_sitemaps=20, timeout=30):
+        """Collect post URLs from sitemaps, sitemap indexes and RSS/Atom feeds
+
+        Returns a dict of url -> last-modified (or published) timestamp, or
+        None where the source gives no date. Only URLs starting with
+        url_prefix are kept.
+        """
+        discovered = {}
+        queue = list(feed_urls)
+        fetched = 0
+        while queue and fetched < max_sitemaps:
+            feed_url = queue.pop(0)
+            fetched += 1
+            try:
+                response = requests.get(feed_url, timeout=timeout)
+                response.raise_for_status()
+                root = ET.fromstring(response.content)
+            except (requests.RequestException, ET.ParseError) as e:
+                logger.error(f"Error reading feed {feed_url}: {e}")
+                continue
+
+            kind = local_name(root.tag)
+            if kind == "sitemapindex":
+                queue.extend(child_text(sitemap, "loc") for sitemap in root if child_text(sitemap, "loc"))
+                continue
+
+            if kind == "urlset":
+                entries = [(child_text(item, "loc"), child_text(item, "lastmod")) for item in root]
+            else:
+                # RSS items carry link/pubDate, Atom entries link/updated
+                items = [item for item in root.iter() if local_name(item.tag) in ("item", "entry")]
+                entries = [
+                    (child_text(item, "link"), child_text(item, "pubDate") or child_text(item, "updated"))
+                    for item in items
+                ]
+
+            for url, modified in entries:
+                if url and validate_url(url) and (not url_prefix or url.startswith(url_prefix)):
+                    discovered[url] = parse_feed_date(modified)
+
+        logger.info(f"Discovered {len(discovered)} URLs from {fetched} feeds")
+        return discovered
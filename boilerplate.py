@@ -0,0 +1,134 @@
+# boilerplate.py
+import json
+import math
+import os
+import re
+import zlib
+from urllib.parse import urlparse
+from utils import logger
+
+# A byline author: first and last name with an optional middle initial or quoted nickname
+AUTHOR = r"[A-Z][\w'’.-]*(?: [A-Z]\.| '[A-Z]\w*')? [A-Z][\w'’-]+"
+
+# Page header template: a few lead words (site name, category), a publication
+# date, the displayed title, then "By" and the authors, e.g. "ArcGIS Blog
+# Imagery & Remote Sensing Nov 12, 2024 <title> By Jeff Swain and Ling Tang"
+HEADER_PATTERN = re.compile(
+    r"^(?:\S+ ){0,10}?"
+    r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.? \d{1,2}, \d{4} "
+    r"(?:\S+ ){1,30}?"
+    rf"By {AUTHOR}(?:(?:,| and|, and| &) {AUTHOR})* "
+)
+
+class BoilerplateModel:
+    """Learn site chrome shared across pages of a domain and strip it from page text
+
+    Extracted text is collapsed to a single line, so pages are compared as
+    word shingles (runs of shingle_size words). A shingle seen on at least
+    min_ratio of a domain's pages (and at least min_documents pages) is
+    treated as boilerplate. Document frequencies are kept per domain and
+    updated incrementally as pages are ingested.
+
+    Page headers repeat a layout rather than exact words (category, date,
+    title and authors differ per page), so shingles cannot find them. The
+    model also counts how many of a domain's pages open with HEADER_PATTERN
+    and strips that header once the same thresholds are met.
+    """
+
+    def __init__(self, model_file, shingle_size=6, min_documents=5, min_ratio=0.5, max_shingles=200000):
+        self.model_file = model_file
+        self.shingle_size = shingle_size
+        self.min_documents = min_documents
+        self.min_ratio = min_ratio
+        self.max_shingles = max_shingles
+        self.domains = {}
+        self.load()
+
+    def load(self):
+        """Load the persisted model, starting empty if it is missing or was built with another shingle size"""
+        try:
+            if os.path.exists(self.model_file) and os.path.getsize(self.model_file) > 0:
+                with open(self.model_file, 'r') as f:
+                    data = json.load(f)
+                if data.get("shingle_size") != self.shingle_size:
+                    logger.warning("Boilerplate model was built with a different shingle size; starting fresh")
+                    return
+                domains = data.get("domains", {})
+                if any("headers" not in stats for stats in domains.values()):
+                    logger.warning("Boilerplate model predates header templates; starting fresh")
+                    return
+                for domain, stats in domains.items():
+                    self.domains[domain] = {
+                        "urls": set(stats.get("urls", [])),
+                        "shingles": {int(h): count for h, count in stats.get("shingles", {}).items()},
+                        "headers": stats["headers"]
+                    }
+        except Exception as e:
+            logger.error(f"Error loading boilerplate model: {e}")
+
+    def save(self):
+        """Persist the model"""
+        try:
+            data = {
+                "shingle_size": self.shingle_size,
+                "domains": {
+                    domain: {
+                        "urls": sorted(stats["urls"]),
+                        "shingles": {str(h): count for h, count in stats["shingles"].items()},
+                        "headers": stats["headers"]
+                    }
+                    for domain, stats in self.domains.items()
+                }
+            }
+            with open(self.model_file, 'w') as f:
+                json.dump(data, f)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving boilerplate model: {e}")
+            return False
+
+    def shingle_hashes(self, words):
+        """Return the hash of every shingle in a word list, in position order"""
+        size = self.shingle_size
+        return [
+            zlib.crc32(" ".join(words[i:i + size]).lower().encode('utf-8'))
+            for i in range(len(words) - size + 1)
+        ]
+
+    def update(self, url, content):
+        """Add a page's shingles to its domain's document frequencies (each URL counts once)"""
+        domain = urlparse(url).netloc
+        stats = self.domains.setdefault(domain, {"urls": set(), "shingles": {}, "headers": 0})
+        if url in stats["urls"]:
+            return
+
+        stats["urls"].add(url)
+        if HEADER_PATTERN.match(content):
+            stats["headers"] += 1
+        shingles = stats["shingles"]
+        for h in set(self.shingle_hashes(content.split())):
+            shingles[h] = shingles.get(h, 0) + 1
+
+        # Bound the model: shingles seen only once cannot be boilerplate yet
+        if len(shingles) > self.max_shingles:
+            stats["shingles"] = {h: count for h, count in shingles.items() if count > 1}
+
+    def strip(self, url, content):
+        """Remove boilerplate shingles learned for the page's domain, returning the cleaned text"""
+        stats = self.domains.get(urlparse(url).netloc)
+        if not stats or len(stats["urls"]) < self.min_documents:
+            return content
+
+        threshold = max(self.min_documents, math.ceil(self.min_ratio * len(stats["urls"])))
+        shingles = stats["shingles"]
+
+        if stats["headers"] >= threshold:
+            content = HEADER_PATTERN.sub("", content, count=1)
+
+        words = content.split()
+        covered = bytearray(len(words))
+        for i, h in enumerate(self.shingle_hashes(words)):
+            if shingles.get(h, 0) >= threshold:
+                covered[i:i + self.shingle_size] = b"\x01" * self.shingle_size
+
+        return " ".join(word for word, is_boilerplate in zip(words, covered) if not is_boilerplate)
@@ -23,6 +23,52 @@ DATA_DIR = "data"
 OUTPUT_DIR = "output"
 URL_FILE = os.path.join(DATA_DIR, "urls.txt")
 STORAGE_FILE = os.path.join(DATA_DIR, "blog_data.json")
+SHARD_BY = None  # None (single file), "domain", "month" or "domain_month"
+SEARCH_WORKERS = 4  # threads used to search shards in parallel
+LEXICAL_INDEX_DIR = os.path.join(DATA_DIR, "lexical_index")
+LEXICAL_SAVE_INTERVAL = 20  # documents added between lexical index saves during ingest
+RETRIEVAL_MODE = "vector"  # lexical, vector or hybrid
+HYBRID_CANDIDATES = 50  # posts taken from each ranking before fusion
+DIVERSITY_CANDIDATES = 0  # vector-mode candidates re-ranked by maximal marginal relevance, e.g. 50; 0 disables
+MMR_LAMBDA = 0.7  # 1.0 ranks by relevance alone, lower values favour distinct posts
+DUPLICATE_THRESHOLD = 0.94  # cosine similarity at which a candidate counts as a near-duplicate
+TOPIC_CLUSTERS = None  # group the selected posts into this many k-means topics
+RETRIEVAL_CACHE_FILE = os.path.join(DATA_DIR, "retrieval_cache.json")
+RETRIEVAL_CACHE_SIZE = 256  # rankings and summaries kept, most recently used first
+SUMMARY_CACHE_ENABLED = True  # reuse the topic summary when the ranked posts are unchanged
+
+# Boilerplate Stripping Configuration
+BOILERPLATE_MODEL_FILE = os.path.join(DATA_DIR, "boilerplate_model.json")
+BOILERPLATE_SHINGLE_SIZE = 6  # words per shingle
+BOILERPLATE_MIN_DOCUMENTS = 5  # pages a domain needs before anything is stripped
+BOILERPLATE_MIN_RATIO = 0.5  # share of a domain's pages a shingle must appear on
+
+# Ingestion Ledger Configuration
+INGEST_LEDGER_FILE = os.path.join(DATA_DIR, "ingest_ledger.json")
+INGEST_MAX_ATTEMPTS = 5
+INGEST_BACKOFF_BASE = 300  # seconds before the first retry; doubles per attempt
+INGEST_BACKOFF_MAX = 86400  # longest wait between retries, in seconds
+
+# Incremental Refresh Configuration
+REFRESH_FEEDS = ["https://www.esri.com/arcgis-blog/feed/"]  # sitemaps, sitemap indexes or RSS/Atom feeds
+REFRESH_URL_PREFIX = "https://www.esri.com/arcgis-blog/products/"  # only discover URLs under this prefix
+REFRESH_MAX_URLS = 50  # URLs checked per run; None for no limit
+REFRESH_MAX_SECONDS = None  # wall-clock budget per run
+REFRESH_MAX_TOKENS = None  # Claude token budget per run
+REFRESH_AGE_HALF_LIFE = 90  # days for a post's re-check priority to halve
+REFRESH_MIN_INTERVAL = 1  # days before a stored post is re-checked
+REFRESH_FETCH_WORKERS = 4
+HOST_MIN_INTERVAL = 1.0  # seconds between request starts to one host
+HOST_MAX_CONCURRENT = 2  # simultaneous requests to one host
+
+# Message Batch Configuration
+BATCH_STATE_FILE = os.path.join(DATA_DIR, "batch_state.json")
+BATCH_POLL_INTERVAL = 60  # seconds between batch status checks
+# The API caps a batch at 100,000 requests and 256 MB; larger runs are split
+BATCH_MAX_REQUESTS = 100000
+BATCH_MAX_BYTES = 200 * 1024 * 1024
+EMBEDDING_BATCH_SIZE = 50
+REEMBED_BATCH_SIZE = 128
 
 # Ensure directories exist
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -1,17 +1,35 @@
 import requests
 from bs4 import BeautifulSoup
 import datetime
-from utils import logger, parse_date
+import hashlib
+import threading
+from ai_interface import MAX_POST_CHARS
+from utils import logger, parse_date, estimate_tokens
 import re
 
 class BlogContentProcessor:
-    def __init__(self, ai_interface, embedding_service):
+    def __init__(self, ai_interface, embedding_service, boilerplate_model=None):
         self.ai_interface = ai_interface
         self.embedding_service = embedding_service
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        self.boilerplate_model = boilerplate_model
+        self.boilerplate_stats = {"pages": 0, "tokens_saved": 0}
+        self.local = threading.local()
+
+    @property
+    def session(self):
+        """Return the calling thread's HTTP session
+
+        requests.Session is not documented as thread-safe, and the refresh
+        scheduler fetches from several worker threads, so each thread gets its own.
+        """
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            })
+            self.local.session = session
+        return session
 
     def fetch_content(self, url):
         """Fetch blog content from a given URL"""
@@ -240,14 +258,15 @@ class BlogContentProcessor:
                 "url": url
             }
 
-    def process_blog(self, url):
-        """Process a blog post completely, returning structured data with summary and embedding"""
-        logger.info(f"Processing blog: {url}")
-
+    def prepare_blog(self, url):
+        """Fetch a blog post and extract its metadata and text, without calling any AI services"""
         html_content = self.fetch_content(url)
         if not html_content:
             return None
+        return self.prepare_from_html(url, html_content)
 
+    def prepare_from_html(self, url, html_content):
+        """Extract a fetched blog post's metadata and text"""
         metadata = self.extract_metadata(html_content, url)
         content = self.extract_text(html_content)
 
@@ -255,23 +274,80 @@ class BlogContentProcessor:
             logger.warning(f"Content too short or not found for {url}")
             return None
 
-        # Get AI summary
-        summary = self.ai_interface.summarize_blog(content, metadata["title"], url)
+        # Hash the text before boilerplate stripping, which shifts as the model learns
+        content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
 
-        # Generate embedding for the summary
-        embedding, model = self.embedding_service.generate_embedding(summary)
+        if self.boilerplate_model:
+            content = self.strip_boilerplate(url, content)
 
-        # Combine all data
-        result = {
+        return {
             "url": url,
             "title": metadata["title"],
             "date": metadata["date"],
-            "content": content[:5000],  # Store truncated content
+            # Nothing past MAX_POST_CHARS is ever sent, so the ledger and batch state need not carry it
+            "content": content[:MAX_POST_CHARS],
+            "content_hash": content_hash
+        }
+
+    def strip_boilerplate(self, url, content):
+        """Learn from and strip shared site chrome, recording the prompt tokens saved"""
+        self.boilerplate_model.update(url, content)
+        stripped = self.boilerplate_model.strip(url, content)
+
+        # Never strip a page down to nothing usable
+        if len(stripped) < 100:
+            return content
+
+        tokens_saved = (estimate_tokens(content[:MAX_POST_CHARS])
+                        - estimate_tokens(stripped[:MAX_POST_CHARS]))
+        self.boilerplate_stats["pages"] += 1
+        self.boilerplate_stats["tokens_saved"] += tokens_saved
+        if tokens_saved:
+            logger.info(f"Stripped boilerplate from {url}: ~{tokens_saved} input tokens saved")
+        return stripped
+
+    def build_record(self, prepared, summary, embedding, model):
+        """Combine prepared post data with its summary and embedding into a stored record"""
+        return {
+            "url": prepared["url"],
+            "title": prepared["title"],
+            "date": prepared["date"],
+            "content": prepared["content"][:5000],  # Store truncated content
             "summary": summary,
             "embedding": embedding,
             "embeddingModel": model,
             "processedDate": datetime.datetime.now().isoformat()
         }
 
-        logger.info(f"Successfully processed blog: {url}")
-        return result
+    def process_blog_with_checkpoints(self, url, ledger, prepared=None):
+        """Process a blog post, checkpointing each stage in the ingest ledger
+
+        Resumes from the prepared post or summary saved by an earlier attempt,
+        unless a freshly prepared post is passed in. Returns the record ready
+        to store, or None after recording the failure.
+        """
+        entry = ledger.get(url)
+        summary = entry.get("summary")
+        if prepared:
+            ledger.mark(url, "fetched", prepared=prepared)
+            summary = None
+        else:
+            prepared = entry.get("prepared")
+
+        try:
+            if not prepared:
+                logger.info(f"Processing blog: {url}")
+                prepared = self.prepare_blog(url)
+                if not prepared:
+                    raise Exception("Could not fetch or extract content")
+                ledger.mark(url, "fetched", prepared=prepared)
+
+            if not summary:
+                summary = self.ai_interface.summarize_blog(prepared["content"], prepared["title"], url)
+                ledger.mark(url, "summarized", summary=summary)
+
+            embedding, model = self.embedding_service.generate_embedding(summary)
+            return self.build_record(prepared, summary, embedding, model)
+        except Exception as e:
+            ledger.mark_failed(url, str(e))
+            return None
@@ -1,16 +1,91 @@
+import glob
 import json
 import os
+import re
+import time
 import numpy as np
 from datetime import datetime
+from urllib.parse import urlparse
 from utils import logger
 
+SHARD_MODES = ("domain", "month", "domain_month")
+
+# Record fields holding embedding vectors; these are kept out of the lazy record file
+EMBEDDING_FIELDS = ("embedding", "embeddings")
+
+def record_embeddings(post):
+    """Return a record's embeddings keyed by model
+
+    The primary embedding lives in embedding/embeddingModel; vectors from other
+    models (e.g. during a re-embed) live in the embeddings mapping.
+    """
+    embeddings = dict(post.get("embeddings") or {})
+    if post.get("embedding"):
+        embeddings[post.get("embeddingModel") or "unknown"] = post["embedding"]
+    return embeddings
+
+def write_atomic(path, write, binary=False):
+    """Write a file through a temp file and os.replace
+
+    Readers that hold the old file open (or memory-mapped) keep seeing the
+    old contents instead of a truncated or half-written file.
+    """
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'wb' if binary else 'w') as f:
+        write(f)
+    os.replace(tmp_file, path)
+
+def save_array(path, array):
+    """Save a numpy array to path atomically"""
+    write_atomic(path, lambda f: np.save(f, array), binary=True)
+
+def carry_forward_embeddings(previous, blog_data):
+    """Return blog_data with the vectors a replaced record held for other models
+
+    While a re-embed is in progress a record holds vectors for several models,
+    and a re-ingest only embeds with one of them. The others are kept so the
+    post stays searchable under every model. If the summary changed, they
+    are listed in staleEmbeddings for the next re-embed to refresh.
+    """
+    current = record_embeddings(blog_data)
+    kept = {
+        model: vector for model, vector in (previous.get("embeddings") or {}).items()
+        if model not in current
+    }
+    if not kept:
+        return blog_data
+
+    stale = set(previous.get("staleEmbeddings") or []) & set(kept)
+    if previous.get("summary") != blog_data.get("summary"):
+        stale = set(kept)
+
+    blog_data = dict(blog_data)
+    blog_data["embeddings"] = {**kept, **(blog_data.get("embeddings") or {})}
+    if stale:
+        blog_data["staleEmbeddings"] = sorted(stale)
+    return blog_data
+
 class DataStore:
-    def __init__(self, storage_file):
+    def __init__(self, storage_file, shard_by=None):
         self.storage_file = storage_file
+        # None keeps everything in storage_file; otherwise one of SHARD_MODES
+        if shard_by is not None and shard_by not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode: {shard_by}")
+        self.shard_by = shard_by
+        self.shard_dir = os.path.splitext(storage_file)[0] + "_shards"
+        self.manifest_file = os.path.join(self.shard_dir, "manifest.json")
+        self.version_file = os.path.splitext(storage_file)[0] + ".version"
         self.ensure_storage_file()
 
     def ensure_storage_file(self):
-        """Ensure the storage file exists"""
+        """Ensure the storage file (or shard directory and manifest) exists"""
+        if self.shard_by:
+            if not os.path.exists(self.manifest_file):
+                os.makedirs(self.shard_dir, exist_ok=True)
+                self.save_manifest({"shard_by": self.shard_by, "shards": {}, "urls": {}})
+                logger.info(f"Created new shard manifest: {self.manifest_file}")
+            return
+
         if not os.path.exists(self.storage_file):
             directory = os.path.dirname(self.storage_file)
             if directory and not os.path.exists(directory):
@@ -19,50 +94,349 @@ class DataStore:
                 json.dump([], f)
             logger.info(f"Created new storage file: {self.storage_file}")
 
+    def load_manifest(self):
+        """Load the shard manifest describing each shard's file, domain and date range"""
+        with open(self.manifest_file, 'r') as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest):
+        """Persist the shard manifest"""
+        write_atomic(self.manifest_file, lambda f: json.dump(manifest, f, indent=2))
+
+    def get_corpus_version(self):
+        """Return the corpus version, which every write bumps so cached results can be invalidated"""
+        try:
+            with open(self.version_file, 'r') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def bump_corpus_version(self):
+        """Advance the corpus version after a write"""
+        version = self.get_corpus_version() + 1
+        write_atomic(self.version_file, lambda f: f.write(str(version)))
+        return version
+
+    def shard_key_for(self, blog_data):
+        """Return the shard key a record belongs to under the current shard mode"""
+        domain = urlparse(blog_data.get('url', '')).netloc or "unknown"
+        month = (blog_data.get('date') or "unknown")[:7]
+        if self.shard_by == "domain":
+            return domain
+        if self.shard_by == "month":
+            return month
+        return f"{domain}_{month}"
+
+    def shard_file(self, key):
+        """Return the records file for a shard; None is the unsharded store"""
+        if key is None:
+            return self.storage_file
+        return os.path.join(self.shard_dir, f"{key}.json")
+
+    def column_paths(self, key):
+        """Return the derived column files used for lazy search over a shard
+
+        records holds one JSON record per line (without embeddings), offsets
+        holds each line's byte offset, dates and urls hold each record's date
+        and URL, and models lists the embedding models that have a vectors
+        file. Each model's embedding matrix lives in its own vectors file.
+        """
+        base = os.path.splitext(self.shard_file(key))[0]
+        return {
+            "records": base + ".records.jsonl",
+            "offsets": base + ".offsets.npy",
+            "dates": base + ".dates.npy",
+            "urls": base + ".urls.npy",
+            "models": base + ".models.json"
+        }
+
+    def vectors_path(self, key, model):
+        """Return the embedding matrix file for one model within a shard"""
+        base = os.path.splitext(self.shard_file(key))[0]
+        safe_model = re.sub(r'[^\w.-]', '_', model)
+        return f"{base}.vectors.{safe_model}.npy"
+
+    def get_shard_keys(self, start_date=None, end_date=None):
+        """Return the shards whose date range overlaps the filter, without opening them"""
+        if not self.shard_by:
+            return [None]
+
+        keys = []
+        for key, info in self.load_manifest()["shards"].items():
+            if not info.get("count"):
+                continue
+            if start_date and info.get("max_date") and info["max_date"] < start_date:
+                continue
+            if end_date and info.get("min_date") and info["min_date"] > end_date:
+                continue
+            keys.append(key)
+        return keys
+
+    def count_records(self):
+        """Return the number of stored records without loading them"""
+        if self.shard_by:
+            return sum(info.get("count", 0) for info in self.load_manifest()["shards"].values())
+        return len(np.load(self.ensure_columns(None)["urls"]))
+
+    def load_shard(self, key):
+        """Load the records of a single shard"""
+        records_file = self.shard_file(key)
+        try:
+            if os.path.exists(records_file) and os.path.getsize(records_file) > 0:
+                with open(records_file, 'r') as f:
+                    return json.load(f)
+            return []
+        except Exception as e:
+            logger.error(f"Error loading shard {records_file}: {e}")
+            return []
+
+    def build_embedding_matrix(self, records, model):
+        """Stack one model's embeddings into a matrix aligned with records; rows without one are zeros"""
+        vectors = [record_embeddings(post).get(model) for post in records]
+        dims = [len(vector) for vector in vectors if vector]
+        if not dims:
+            return np.zeros((len(records), 0), dtype=np.float32)
+
+        dim = max(set(dims), key=dims.count)
+        matrix = np.zeros((len(records), dim), dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            if vector and len(vector) == dim:
+                matrix[i] = vector
+        return matrix
+
+    def write_columns(self, key, records):
+        """Write a shard's derived column files from its full records
+
+        Every file is replaced atomically, so concurrent searches never see
+        a truncated file; read_shard_records detects an offsets file and
+        record file from different writes.
+        """
+        paths = self.column_paths(key)
+
+        model_counts = {}
+        for post in records:
+            for model in record_embeddings(post):
+                model_counts[model] = model_counts.get(model, 0) + 1
+
+        # Drop vectors files for models no longer present in the shard
+        base = os.path.splitext(self.shard_file(key))[0]
+        current = {self.vectors_path(key, model) for model in model_counts}
+        for path in glob.glob(glob.escape(base) + ".vectors.*.npy"):
+            if path not in current:
+                os.remove(path)
+
+        for model in model_counts:
+            save_array(self.vectors_path(key, model), self.build_embedding_matrix(records, model))
+
+        offsets = [0]
+
+        def write_records(f):
+            for post in records:
+                row = {field: value for field, value in post.items() if field not in EMBEDDING_FIELDS}
+                f.write((json.dumps(row) + "\n").encode('utf-8'))
+                offsets.append(f.tell())
+        write_atomic(paths["records"], write_records, binary=True)
+        save_array(paths["offsets"], np.array(offsets, dtype=np.int64))
+        save_array(paths["dates"], np.array([post.get('date') or "" for post in records], dtype=str))
+        save_array(paths["urls"], np.array([post.get('url') or "" for post in records], dtype=str))
+
+        # Written last: its mtime marks the columns as current
+        primary_counts = {}
+        for post in records:
+            if post.get("embedding") and post.get("embeddingModel"):
+                primary_counts[post["embeddingModel"]] = primary_counts.get(post["embeddingModel"], 0) + 1
+        models = {
+            "primary": max(primary_counts, key=primary_counts.get) if primary_counts else None,
+            "models": model_counts
+        }
+        write_atomic(paths["models"], lambda f: json.dump(models, f, indent=2))
+
+    def ensure_columns(self, key):
+        """Rebuild a shard's column files if they are missing or older than its records file"""
+        records_file = self.shard_file(key)
+        paths = self.column_paths(key)
+        if (all(os.path.exists(path) for path in paths.values())
+                and os.path.getmtime(paths["models"]) >= os.path.getmtime(records_file)):
+            return paths
+
+        logger.info(f"Rebuilding search columns for {records_file}")
+        self.write_columns(key, self.load_shard(key))
+        return paths
+
+    def load_shard_models(self, key):
+        """Return the shard's embedding model summary: its primary model and per-model counts"""
+        paths = self.ensure_columns(key)
+        with open(paths["models"], 'r') as f:
+            return json.load(f)
+
+    def load_shard_embeddings(self, key, model=None):
+        """Memory-map one model's embedding matrix for a shard without loading its records
+
+        With no model, the shard's primary model (its records' embeddingModel) is used.
+        """
+        if model is None:
+            model = self.load_shard_models(key)["primary"]
+        else:
+            self.ensure_columns(key)
+
+        vectors_file = self.vectors_path(key, model) if model else None
+        if not vectors_file or not os.path.exists(vectors_file):
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.load(vectors_file, mmap_mode='r')
+
+    def load_shard_dates(self, key):
+        """Load a shard's date column, aligned with its embedding matrix rows"""
+        paths = self.ensure_columns(key)
+        return np.load(paths["dates"])
+
+    def read_shard_records(self, key, rows):
+        """Read only the requested rows of a shard from its offset-indexed record file"""
+        paths = self.ensure_columns(key)
+        for attempt in range(5):
+            with open(paths["records"], 'rb') as f:
+                offsets = np.load(paths["offsets"], mmap_mode='r')
+                # A write between opening the two files leaves offsets that do not end at this file's size
+                if int(offsets[-1]) != os.fstat(f.fileno()).st_size:
+                    time.sleep(0.05)
+                    continue
+                records = []
+                for row in rows:
+                    start, end = int(offsets[row]), int(offsets[row + 1])
+                    f.seek(start)
+                    records.append(json.loads(f.read(end - start)))
+                return records
+        raise RuntimeError(f"Search columns for shard {key} kept changing while being read")
+
+    def locate_records(self, urls):
+        """Return the (shard, row) position of each given URL that is stored, keyed by URL"""
+        if self.shard_by:
+            url_shards = self.load_manifest()["urls"]
+            keys = {url_shards[url] for url in urls if url in url_shards}
+        else:
+            keys = {None}
+
+        wanted = set(urls)
+        positions = {}
+        for key in keys:
+            shard_urls = np.load(self.ensure_columns(key)["urls"])
+            for row, url in enumerate(shard_urls):
+                if url in wanted:
+                    positions[str(url)] = (key, row)
+        return positions
+
+    def find_records(self, urls):
+        """Read the records for the given URLs from the lazy record files, keyed by URL"""
+        rows_by_shard = {}
+        for key, row in self.locate_records(urls).values():
+            rows_by_shard.setdefault(key, []).append(row)
+
+        found = {}
+        for key, rows in rows_by_shard.items():
+            for post in self.read_shard_records(key, sorted(rows)):
+                found[post["url"]] = post
+        return found
+
+    def write_shard(self, key, records, manifest=None):
+        """Write a shard's records and search columns, updating its manifest entry"""
+        records_file = self.shard_file(key)
+        write_atomic(records_file, lambda f: json.dump(records, f, indent=2))
+        self.write_columns(key, records)
+
+        if manifest is not None:
+            dates = [post.get('date') for post in records if post.get('date')]
+            manifest["shards"][key] = {
+                "file": os.path.basename(records_file),
+                "count": len(records),
+                "min_date": min(dates) if dates else None,
+                "max_date": max(dates) if dates else None
+            }
+
     def save_blog_data(self, blog_data):
         """Save processed blog data with embeddings to storage"""
+        return self.save_many_blog_data([blog_data])
+
+    def save_many_blog_data(self, records):
+        """Save several processed records with a single read and write per affected shard"""
         try:
-            existing_data = self.load_all_data()
-
-            # Check if URL already exists and update if it does
-            for i, post in enumerate(existing_data):
-                if post.get('url') == blog_data.get('url'):
-                    # Update existing entry
-                    existing_data[i] = blog_data
-                    logger.info(f"Updated existing entry for URL: {blog_data.get('url')}")
-                    break
-            else:
-                # URL not found, add new entry
-                existing_data.append(blog_data)
-                logger.info(f"Added new entry for URL: {blog_data.get('url')}")
-
-            # Save updated data
-            with open(self.storage_file, 'w') as f:
-                json.dump(existing_data, f, indent=2)
+            manifest = self.load_manifest() if self.shard_by else None
+            shards = {}
+
+            def shard_records(key):
+                if key not in shards:
+                    shards[key] = self.load_shard(key)
+                return shards[key]
+
+            for blog_data in records:
+                url = blog_data.get('url')
+                key = self.shard_key_for(blog_data) if self.shard_by else None
+
+                # A record whose date changed may move to a different shard
+                previous_key = manifest["urls"].get(url) if manifest else None
+                if previous_key is not None and previous_key != key:
+                    for post in shard_records(previous_key):
+                        if post.get('url') == url:
+                            blog_data = carry_forward_embeddings(post, blog_data)
+                    shards[previous_key] = [
+                        post for post in shard_records(previous_key) if post.get('url') != url
+                    ]
+
+                target = shard_records(key)
+                for i, post in enumerate(target):
+                    if post.get('url') == url:
+                        target[i] = carry_forward_embeddings(post, blog_data)
+                        logger.info(f"Updated existing entry for URL: {url}")
+                        break
+                else:
+                    target.append(blog_data)
+                    logger.info(f"Added new entry for URL: {url}")
+
+                if manifest is not None:
+                    manifest["urls"][url] = key
+
+            for key, shard in shards.items():
+                self.write_shard(key, shard, manifest)
+            if manifest is not None:
+                self.save_manifest(manifest)
+            self.bump_corpus_version()
 
             return True
         except Exception as e:
             logger.error(f"Error saving blog data: {e}")
             return False
 
+    def cutover_embedding_model(self, model):
+        """Promote a model's vectors to the primary embedding and drop every other model's column
+
+        Records without a vector for the model are left unchanged. Returns the
+        number of records promoted.
+        """
+        manifest = self.load_manifest() if self.shard_by else None
+        promoted = 0
+        for key in self.get_shard_keys():
+            records = self.load_shard(key)
+            for post in records:
+                vector = record_embeddings(post).get(model)
+                if vector is None:
+                    continue
+                post["embedding"] = vector
+                post["embeddingModel"] = model
+                post.pop("embeddings", None)
+                post.pop("staleEmbeddings", None)
+                promoted += 1
+            self.write_shard(key, records, manifest)
+        if manifest is not None:
+            self.save_manifest(manifest)
+        self.bump_corpus_version()
+
+        logger.info(f"Promoted {promoted} records to embedding model {model}")
+        return promoted
+
     def load_all_data(self):
         """Load all stored blog data including embeddings"""
-        try:
-            if os.path.exists(self.storage_file) and os.path.getsize(self.storage_file) > 0:
-                with open(self.storage_file, 'r') as f:
-                    return json.load(f)
-            return []
-        except Exception as e:
-            logger.error(f"Error loading data: {e}")
-            return []
-
-    def is_url_processed(self, url):
-        """Check if a URL has already been processed"""
-        data = self.load_all_data()
-        for post in data:
-            if post.get('url') == url:
-                return True
-        return False
+        data = []
+        for key in self.get_shard_keys():
+            data.extend(self.load_shard(key))
+        return data
 
     def get_embeddings_as_matrix(self):
         """Return a matrix of all embeddings for efficient similarity calculation"""
@@ -58,6 +58,43 @@ class EmbeddingService:
                 raise Exception(f"Error generating embedding: {response.text}")
         except Exception as e:
             logger.error(f"Exception generating embedding: {str(e)}")
-            # Return a default embedding as fallback (all zeros)
-            # This is not ideal but allows the process to continue
-            return [0.0] * 1024, self.model  # Voyage models typically use 1024 dimensions
+            # Never fall back to a placeholder vector: callers record the failure instead
+            raise
+
+    def batch_generate_embeddings(self, texts, batch_size=50):
+        """Generate embeddings for multiple texts in batches, preserving input order"""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+        results = []
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
+
+            payload = {
+                "model": self.model,
+                "input": batch,
+                "input_type": "document"
+            }
+
+            logger.info(f"Generating {len(batch)} embeddings using model {self.model}")
+            response = requests.post(self.base_url, headers=headers, json=payload)
+
+            if response.status_code != 200:
+                logger.error(f"Error generating batch embeddings: {response.text}")
+                raise Exception(f"Error generating batch embeddings: {response.text}")
+
+            result = response.json()
+            if "data" in result:
+                # Format: {"data": [{"embedding": [...], "index": 0}, ...]}
+                data = sorted(result["data"], key=lambda item: item.get("index", 0))
+                results.extend(item["embedding"] for item in data)
+            elif "embeddings" in result:
+                # Format: {"embeddings": [[...], ...]}
+                results.extend(result["embeddings"])
+            else:
+                logger.error(f"Unexpected response format: {result}")
+                raise Exception(f"Unexpected response format: {list(result.keys())}")
+
+        return results, self.model
@@ -0,0 +1,213 @@
+# ingest_ledger.py
+import json
+import os
+from datetime import datetime, timedelta
+from data_store import record_embeddings
+from utils import logger
+
+# Ingestion states, in pipeline order, plus "failed"
+INGEST_STATES = ("pending", "fetched", "summarized", "embedded", "failed")
+
+class IngestLedger:
+    """Persistent per-URL ingestion state with a retry queue
+
+    Each entry records the last state reached. While a URL is in flight its
+    intermediate results (the prepared post after fetching, the summary after
+    summarizing) are kept in the entry so a restarted run resumes from the
+    next stage. Failed entries keep those results plus the failure reason and
+    attempt count, and become due for retry after an exponential backoff.
+
+    The file is a journal with one JSON line per entry update, so saving
+    appends only the entries changed since the last save. When superseded
+    lines outnumber the live entries, the journal is compacted to one line
+    per URL.
+    """
+
+    def __init__(self, ledger_file, max_attempts=5, backoff_base=300, backoff_max=86400):
+        self.ledger_file = ledger_file
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dirty = set()
+        self.entries = self.load()
+
+    def load(self):
+        """Replay the ledger journal, starting empty if it does not exist"""
+        self.journal_lines = 0
+        # Set when the file is not a clean journal, so the next save rewrites it
+        self.needs_compaction = False
+        entries = {}
+        try:
+            if not os.path.exists(self.ledger_file) or os.path.getsize(self.ledger_file) == 0:
+                return entries
+            with open(self.ledger_file, 'r') as f:
+                text = f.read()
+            lines = text.splitlines()
+            self.needs_compaction = not text.endswith("\n")
+            for i, line in enumerate(lines):
+                try:
+                    update = json.loads(line)
+                except ValueError:
+                    update = None
+                if i == 0 and not (isinstance(update, dict) and "entry" in update):
+                    # A ledger from before the journal format is a single JSON object
+                    self.needs_compaction = True
+                    return json.loads(text)
+                if update is None:
+                    # A line cut short by a crash mid-append
+                    logger.warning(f"Skipping unreadable line {i + 1} of {self.ledger_file}")
+                    self.needs_compaction = True
+                    continue
+                entries[update["url"]] = update["entry"]
+                self.journal_lines += 1
+            return entries
+        except Exception as e:
+            logger.error(f"Error loading ingest ledger: {e}")
+            return {}
+
+    def save(self):
+        """Append the entries changed since the last save, compacting the journal when it grows"""
+        if self.needs_compaction or self.journal_lines + len(self.dirty) > 2 * len(self.entries) + 100:
+            self.compact()
+            return
+        if not self.dirty:
+            return
+        with open(self.ledger_file, 'a') as f:
+            for url in self.dirty:
+                f.write(json.dumps({"url": url, "entry": self.entries[url]}) + "\n")
+        self.journal_lines += len(self.dirty)
+        self.dirty.clear()
+
+    def compact(self):
+        """Rewrite the journal with one line per URL, replacing the file atomically"""
+        tmp_file = self.ledger_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            for url, entry in self.entries.items():
+                f.write(json.dumps({"url": url, "entry": entry}) + "\n")
+        os.replace(tmp_file, self.ledger_file)
+        self.journal_lines = len(self.entries)
+        self.needs_compaction = False
+        self.dirty.clear()
+
+    def get(self, url):
+        """Return a URL's entry, or a pending entry if it has none"""
+        return self.entries.get(url, {"state": "pending", "attempts": 0})
+
+    def mark(self, url, state, save=True, **results):
+        """Record that a URL reached a state, keeping any intermediate results passed in"""
+        entry = self.entries.setdefault(url, {"attempts": 0})
+        self.dirty.add(url)
+        # A newly fetched post invalidates any summary of an earlier version
+        if state == "fetched":
+            entry.pop("summary", None)
+        entry.update(results)
+        entry["state"] = state
+        entry["updated"] = datetime.now().isoformat()
+        entry.pop("reason", None)
+        entry.pop("next_attempt", None)
+
+        # Intermediate results are only needed until the post is stored
+        if state == "embedded":
+            content_hash = (entry.get("prepared") or {}).get("content_hash")
+            if content_hash:
+                entry["content_hash"] = content_hash
+            entry.pop("prepared", None)
+            entry.pop("summary", None)
+            entry.pop("stage", None)
+            entry["attempts"] = 0
+        if save:
+            self.save()
+
+    def mark_failed(self, url, reason, save=True, **results):
+        """Record a failure and schedule the URL for retry with exponential backoff"""
+        entry = self.entries.setdefault(url, {"attempts": 0})
+        self.dirty.add(url)
+        entry.update(results)
+        if entry.get("state") != "failed":
+            entry["stage"] = entry.get("state", "pending")
+        entry["state"] = "failed"
+        entry["reason"] = reason
+        entry["attempts"] = entry.get("attempts", 0) + 1
+
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (entry["attempts"] - 1))
+        now = datetime.now()
+        entry["updated"] = now.isoformat()
+        entry["next_attempt"] = (now + timedelta(seconds=delay)).isoformat()
+        if save:
+            self.save()
+
+        if entry["attempts"] >= self.max_attempts:
+            logger.error(f"Giving up on {url} after {entry['attempts']} attempts: {reason}")
+        else:
+            logger.warning(f"Failed {url} (attempt {entry['attempts']}), retrying after {entry['next_attempt']}: {reason}")
+
+    def record_check(self, url, content_hash, changed, save=True):
+        """Record a refresh check of a stored post and whether its content had changed"""
+        entry = self.entries.setdefault(url, {"state": "embedded", "attempts": 0})
+        self.dirty.add(url)
+        entry["checks"] = entry.get("checks", 0) + 1
+        entry["changes"] = entry.get("changes", 0) + int(changed)
+        entry["checked"] = datetime.now().isoformat()
+        entry["content_hash"] = content_hash
+        if save:
+            self.save()
+
+    def should_process(self, url, force_refresh=False, ignore_backoff=False):
+        """Decide whether a URL needs work in this run"""
+        entry = self.get(url)
+        state = entry["state"]
+
+        if state == "embedded":
+            return force_refresh
+        if state != "failed":
+            return True
+        if entry["attempts"] >= self.max_attempts and not force_refresh:
+            return False
+        return ignore_backoff or force_refresh or entry.get("next_attempt", "") <= datetime.now().isoformat()
+
+    def sync_with_store(self, records):
+        """Bring the ledger in line with already-stored records
+
+        Stored posts without a ledger entry are marked embedded. Posts stored
+        with a missing or all-zero embedding (the old fallback when embedding
+        failed) are marked failed, keeping their summary so only the
+        embedding step is retried.
+        """
+        changed = 0
+        for post in records:
+            url = post.get("url")
+            vectors = record_embeddings(post)
+            if vectors and any(any(vector) for vector in vectors.values()):
+                if url not in self.entries:
+                    self.entries[url] = {"state": "embedded", "attempts": 0, "updated": datetime.now().isoformat()}
+                    self.dirty.add(url)
+                    changed += 1
+                continue
+
+            entry = self.get(url)
+            if entry["state"] == "failed":
+                continue
+            prepared = {field: post.get(field) for field in ("url", "title", "date", "content")}
+            self.entries[url] = {"state": "summarized", "attempts": entry.get("attempts", 0)}
+            self.mark_failed(url, "Stored embedding is a zero-vector fallback", save=False,
+                             prepared=prepared, summary=post.get("summary"))
+            changed += 1
+
+        if changed:
+            self.save()
+        return changed
+
+    def counts(self):
+        """Return the number of URLs in each state"""
+        counts = {state: 0 for state in INGEST_STATES}
+        for entry in self.entries.values():
+            counts[entry["state"]] = counts.get(entry["state"], 0) + 1
+        return counts
+
+    def retry_queue(self):
+        """Return failed (url, entry) pairs that will still be retried, soonest first"""
+        queue = [
+            (url, entry) for url, entry in self.entries.items()
+            if entry["state"] == "failed" and entry["attempts"] < self.max_attempts
+        ]
+        return sorted(queue, key=lambda item: item[1].get("next_attempt", ""))
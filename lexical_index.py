@@ -0,0 +1,241 @@
+# lexical_index.py
+import heapq
+import json
+import math
+import os
+import re
+from utils import logger
+
+# Keep dotted version numbers such as "3.4" or "4.31" as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "with", "you", "your"
+}
+
+# Title and summary terms count more than body terms
+FIELD_WEIGHTS = (("title", 3), ("summary", 2), ("content", 1))
+
+def tokenize(text):
+    """Split text into lowercase index terms, dropping stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def encode_varint(value, out):
+    """Append a non-negative integer to a bytearray as a LEB128 varint"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_postings(data):
+    """Decode a postings list of (doc id gap, term frequency) varint pairs into (doc id, tf) tuples"""
+    postings = []
+    doc_id = -1
+    value = shift = 0
+    gap = None
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if gap is None:
+            gap = value
+        else:
+            doc_id += gap
+            postings.append((doc_id, value))
+            gap = None
+        value = shift = 0
+    return postings
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several ranked URL lists into one list of (url, score), best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, url in enumerate(ranking, 1):
+            scores[url] = scores.get(url, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class LexicalIndex:
+    """On-disk BM25 inverted index over post titles, summaries and content
+
+    Postings are stored per term as varint-encoded (doc id gap, tf) pairs, so
+    new documents are appended without decoding existing postings. Re-indexed
+    URLs leave a tombstone on their old doc id until the index is rebuilt.
+    """
+
+    def __init__(self, index_dir, k1=1.2, b=0.75):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.lexicon_file = os.path.join(index_dir, "lexicon.json")
+        self.postings_file = os.path.join(index_dir, "postings.bin")
+        self.docs_file = os.path.join(index_dir, "docs.json")
+        self.load()
+
+    def reset(self):
+        """Start with an empty index"""
+        self.docs = {"urls": [], "dates": [], "lengths": [], "deleted": []}
+        # term -> [offset, length, document frequency, last doc id]
+        self.lexicon = {}
+        self.postings_data = b""
+        self.updated_postings = {}
+        self.doc_ids = {}
+        self.deleted = set()
+        self.live_length = 0
+        self.unsaved = 0
+
+    def load(self):
+        """Load the index from disk, starting empty if it does not exist"""
+        self.reset()
+        try:
+            if not os.path.exists(self.docs_file):
+                return
+            with open(self.docs_file, 'r') as f:
+                self.docs = json.load(f)
+            with open(self.lexicon_file, 'r') as f:
+                self.lexicon = json.load(f)
+            with open(self.postings_file, 'rb') as f:
+                self.postings_data = f.read()
+
+            self.deleted = set(self.docs["deleted"])
+            self.doc_ids = {
+                url: doc_id for doc_id, url in enumerate(self.docs["urls"])
+                if doc_id not in self.deleted
+            }
+            self.live_length = sum(self.docs["lengths"][doc_id] for doc_id in self.doc_ids.values())
+        except Exception as e:
+            logger.error(f"Error loading lexical index: {e}")
+            self.reset()
+
+    def save(self):
+        """Write the index to disk, packing every term's postings into one file"""
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            postings = bytearray()
+            for term, entry in self.lexicon.items():
+                data = self.get_postings_bytes(term)
+                entry[0], entry[1] = len(postings), len(data)
+                postings.extend(data)
+
+            self.docs["deleted"] = sorted(self.deleted)
+            for path, write in (
+                (self.postings_file, lambda f: f.write(postings)),
+                (self.lexicon_file, lambda f: f.write(json.dumps(self.lexicon).encode('utf-8'))),
+                (self.docs_file, lambda f: f.write(json.dumps(self.docs).encode('utf-8'))),
+            ):
+                with open(path + ".tmp", 'wb') as f:
+                    write(f)
+                os.replace(path + ".tmp", path)
+
+            self.postings_data = bytes(postings)
+            self.updated_postings = {}
+            self.unsaved = 0
+            return True
+        except Exception as e:
+            logger.error(f"Error saving lexical index: {e}")
+            return False
+
+    def get_postings_bytes(self, term):
+        """Return the encoded postings for a term, including unsaved appends"""
+        if term in self.updated_postings:
+            return self.updated_postings[term]
+        offset, length = self.lexicon[term][0], self.lexicon[term][1]
+        return self.postings_data[offset:offset + length]
+
+    def contains(self, url):
+        """Check if a URL is indexed"""
+        return url in self.doc_ids
+
+    def document_count(self):
+        """Return the number of live (non-tombstoned) documents"""
+        return len(self.doc_ids)
+
+    def add_document(self, post):
+        """Index a post's title, summary and content, replacing any earlier version of its URL"""
+        url = post.get("url")
+        if url in self.doc_ids:
+            old_id = self.doc_ids[url]
+            self.deleted.add(old_id)
+            self.live_length -= self.docs["lengths"][old_id]
+
+        term_counts = {}
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(post.get(field) or ""):
+                term_counts[term] = term_counts.get(term, 0) + weight
+
+        doc_id = len(self.docs["urls"])
+        self.docs["urls"].append(url)
+        self.docs["dates"].append(post.get("date") or "")
+        self.docs["lengths"].append(sum(term_counts.values()))
+        self.doc_ids[url] = doc_id
+        self.live_length += self.docs["lengths"][doc_id]
+
+        for term, tf in term_counts.items():
+            entry = self.lexicon.setdefault(term, [0, 0, 0, -1])
+            if term not in self.updated_postings:
+                self.updated_postings[term] = bytearray(self.get_postings_bytes(term))
+            encode_varint(doc_id - entry[3], self.updated_postings[term])
+            encode_varint(tf, self.updated_postings[term])
+            entry[2] += 1
+            entry[3] = doc_id
+        self.unsaved += 1
+
+    def add_missing(self, records):
+        """Index stored posts the index does not contain yet, returning how many were added
+
+        Catches up on posts stored before the index existed, or whose
+        additions were lost when a run stopped before saving.
+        """
+        missing = [post for post in records if post.get("url") and not self.contains(post["url"])]
+        for post in missing:
+            self.add_document(post)
+        if missing:
+            logger.info(f"Indexed {len(missing)} stored posts missing from the lexical index")
+            self.save()
+        return len(missing)
+
+    def save_if_due(self, interval):
+        """Save once at least interval documents were added since the last save"""
+        if self.unsaved >= interval:
+            self.save()
+
+    def rebuild(self, records):
+        """Rebuild the index from scratch, dropping tombstones"""
+        self.reset()
+        for post in records:
+            self.add_document(post)
+        logger.info(f"Rebuilt lexical index with {len(records)} documents")
+
+    def search(self, query_text, top_n=10, start_date=None, end_date=None):
+        """Return the top N (url, BM25 score) matches for a keyword query"""
+        live_docs = len(self.doc_ids)
+        if not live_docs:
+            return []
+
+        lengths = self.docs["lengths"]
+        dates = self.docs["dates"]
+        avg_length = self.live_length / live_docs
+
+        scores = {}
+        for term in set(tokenize(query_text)):
+            if term not in self.lexicon:
+                continue
+            postings = decode_postings(self.get_postings_bytes(term))
+            doc_freq = len(postings)
+            idf = math.log(1 + (live_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            for doc_id, tf in postings:
+                if doc_id in self.deleted:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if start_date or end_date:
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if (not start_date or dates[doc_id] >= start_date)
+                and (not end_date or dates[doc_id] <= end_date)
+            }
+
+        top = heapq.nlargest(top_n, scores.items(), key=lambda item: item[1])
+        return [(self.docs["urls"][doc_id], score) for doc_id, score in top]
@@ -4,23 +4,110 @@ from blog_sources import BlogSourceHandler
 from content_processor import BlogContentProcessor
 from ai_interface import AIInterface
 from embedding_service import EmbeddingService
-from data_store import DataStore
+from data_store import DataStore, SHARD_MODES
+from batch_processor import BatchProcessor
+from boilerplate import BoilerplateModel
+from reembedder import Reembedder
+from lexical_index import LexicalIndex
+from ingest_ledger import IngestLedger
+from refresh_scheduler import RefreshScheduler, HostLimiter
+from retriever import Retriever, RETRIEVAL_MODES
+from retrieval_cache import RetrievalCache, cache_key
 from query_processor import QueryProcessor
 from similarity_engine import SimilarityEngine
 from summary_generator import SummaryGenerator
 import config
-from utils import logger
+from utils import logger, get_current_date_string, estimate_tokens
 
-def process_blogs(force_refresh=False):
+def log_token_usage(ai_interface):
+    """Log accumulated Claude token usage, including prompt cache activity"""
+    usage = ai_interface.get_usage()
+    logger.info(
+        f"Claude usage over {usage['requests']} requests: "
+        f"input={usage['input_tokens']} output={usage['output_tokens']} "
+        f"cache_write={usage['cache_creation_input_tokens']} "
+        f"cache_read={usage['cache_read_input_tokens']}"
+    )
+
+def load_boilerplate_model():
+    """Load the persisted per-domain boilerplate model"""
+    return BoilerplateModel(
+        config.BOILERPLATE_MODEL_FILE,
+        shingle_size=config.BOILERPLATE_SHINGLE_SIZE,
+        min_documents=config.BOILERPLATE_MIN_DOCUMENTS,
+        min_ratio=config.BOILERPLATE_MIN_RATIO
+    )
+
+def finish_boilerplate(boilerplate_model, content_processor):
+    """Persist the updated boilerplate model and log the prompt tokens it saved this run"""
+    boilerplate_model.save()
+    stats = content_processor.boilerplate_stats
+    logger.info(f"Boilerplate stripping saved ~{stats['tokens_saved']} input tokens across {stats['pages']} pages")
+
+def learn_boilerplate():
+    """Learn the boilerplate model from stored content and report the tokens it would save per page"""
+    data_store = DataStore(config.STORAGE_FILE, shard_by=config.SHARD_BY)
+    boilerplate_model = load_boilerplate_model()
+
+    records = data_store.load_all_data()
+    for post in records:
+        boilerplate_model.update(post["url"], post.get("content", ""))
+    boilerplate_model.save()
+
+    total_saved = 0
+    for post in records:
+        content = post.get("content", "")
+        saved = estimate_tokens(content) - estimate_tokens(boilerplate_model.strip(post["url"], content))
+        if saved:
+            print(f"~{saved:>5} tokens  {post['url']}")
+        total_saved += saved
+    print(f"\nBoilerplate stripping would save ~{total_saved} input tokens across {len(records)} pages")
+
+def load_ingest_ledger():
+    """Load the persistent per-URL ingestion ledger"""
+    return IngestLedger(
+        config.INGEST_LEDGER_FILE,
+        max_attempts=config.INGEST_MAX_ATTEMPTS,
+        backoff_base=config.INGEST_BACKOFF_BASE,
+        backoff_max=config.INGEST_BACKOFF_MAX
+    )
+
+def log_ledger_status(ledger):
+    """Log ingestion state counts and the size of the retry queue"""
+    counts = ", ".join(f"{state}={count}" for state, count in ledger.counts().items())
+    logger.info(f"Ingest ledger: {counts}; {len(ledger.retry_queue())} URLs queued for retry")
+
+def show_ingest_status():
+    """Print ingestion state counts and the retry queue"""
+    ledger = load_ingest_ledger()
+    for state, count in ledger.counts().items():
+        print(f"{state:>10}: {count}")
+
+    queue = ledger.retry_queue()
+    if queue:
+        print("\nRetry queue:")
+        for url, entry in queue:
+            print(f"- {url}")
+            print(f"  attempt {entry['attempts']}, failed at {entry.get('stage', 'pending')}, "
+                  f"next attempt {entry.get('next_attempt')}: {entry.get('reason')}")
+
+def process_blogs(force_refresh=False, batch=False, retry_failed=False):
     """Process blogs from the URL file"""
     logger.info("Starting blog processing")
 
     # Initialize components
     ai_interface = AIInterface(config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL)
     embedding_service = EmbeddingService(config.VOYAGE_API_KEY, config.VOYAGE_MODEL)
-    data_store = DataStore(config.STORAGE_FILE)
+    data_store = DataStore(config.STORAGE_FILE, shard_by=config.SHARD_BY)
     blog_source = BlogSourceHandler(config.URL_FILE)
-    content_processor = BlogContentProcessor(ai_interface, embedding_service)
+    boilerplate_model = load_boilerplate_model()
+    content_processor = BlogContentProcessor(ai_interface, embedding_service, boilerplate_model)
+    lexical_index = LexicalIndex(config.LEXICAL_INDEX_DIR)
+    ledger = load_ingest_ledger()
+    records = data_store.load_all_data()
+    ledger.sync_with_store(records)
+    if lexical_index.add_missing(records):
+        data_store.bump_corpus_version()
 
     # Load URLs
     urls = blog_source.load_urls()
@@ -28,55 +115,207 @@ def process_blogs(force_refresh=False):
         logger.warning(f"No URLs found in {config.URL_FILE}. Please add URLs to the file.")
         return False
 
+    if batch:
+        pending_urls = [
+            url for url in urls
+            if ledger.should_process(url, force_refresh, ignore_backoff=retry_failed)
+        ]
+        batch_processor = BatchProcessor(
+            ai_interface, embedding_service, data_store, content_processor,
+            config.BATCH_STATE_FILE,
+            poll_interval=config.BATCH_POLL_INTERVAL,
+            max_batch_requests=config.BATCH_MAX_REQUESTS,
+            max_batch_bytes=config.BATCH_MAX_BYTES,
+            embedding_batch_size=config.EMBEDDING_BATCH_SIZE,
+            lexical_index=lexical_index,
+            ledger=ledger
+        )
+        processed_count = batch_processor.run(pending_urls)
+        logger.info(f"Processed {processed_count} blog posts")
+        log_ledger_status(ledger)
+        finish_boilerplate(boilerplate_model, content_processor)
+        log_token_usage(ai_interface)
+        return processed_count > 0
+
     processed_count = 0
 
     # Process each URL
     for url in urls:
-        # Skip if already processed (unless force refresh is on)
-        if data_store.is_url_processed(url) and not force_refresh:
-            logger.info(f"Skipping already processed URL: {url}")
+        # Skip finished URLs (unless force refresh is on) and failures still backing off
+        if not ledger.should_process(url, force_refresh, ignore_backoff=retry_failed):
+            logger.info(f"Skipping URL: {url} ({ledger.get(url)['state']})")
+            continue
+
+        # Process the blog, resuming from any checkpointed stage
+        blog_data = content_processor.process_blog_with_checkpoints(url, ledger)
+        if not blog_data:
             continue
 
-        # Process the blog
-        try:
-            blog_data = content_processor.process_blog(url)
-            if blog_data:
-                data_store.save_blog_data(blog_data)
-                processed_count += 1
-        except Exception as e:
-            logger.error(f"Error processing blog {url}: {str(e)}")
+        if data_store.save_blog_data(blog_data):
+            lexical_index.add_document(blog_data)
+            lexical_index.save_if_due(config.LEXICAL_SAVE_INTERVAL)
+            ledger.mark(url, "embedded")
+            processed_count += 1
+        else:
+            ledger.mark_failed(url, "Could not save to the data store")
 
     logger.info(f"Processed {processed_count} blog posts")
+    log_ledger_status(ledger)
+    lexical_index.save()
+    finish_boilerplate(boilerplate_model, content_processor)
+    log_token_usage(ai_interface)
     return processed_count > 0
 
-def generate_topic_summary(query_text, top_n=10):
+def refresh_blogs(max_urls=config.REFRESH_MAX_URLS, max_seconds=config.REFRESH_MAX_SECONDS,
+                  max_tokens=config.REFRESH_MAX_TOKENS, discover=True):
+    """Discover new posts and re-check stored ones in priority order within a budget"""
+    logger.info("Starting incremental refresh")
+
+    ai_interface = AIInterface(config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL)
+    embedding_service = EmbeddingService(config.VOYAGE_API_KEY, config.VOYAGE_MODEL)
+    data_store = DataStore(config.STORAGE_FILE, shard_by=config.SHARD_BY)
+    blog_source = BlogSourceHandler(config.URL_FILE)
+    boilerplate_model = load_boilerplate_model()
+    content_processor = BlogContentProcessor(ai_interface, embedding_service, boilerplate_model)
+    ledger = load_ingest_ledger()
+    records = data_store.load_all_data()
+    ledger.sync_with_store(records)
+    lexical_index = LexicalIndex(config.LEXICAL_INDEX_DIR)
+    if lexical_index.add_missing(records):
+        data_store.bump_corpus_version()
+
+    lastmods = {}
+    if discover and config.REFRESH_FEEDS:
+        lastmods = blog_source.discover_urls(config.REFRESH_FEEDS, url_prefix=config.REFRESH_URL_PREFIX)
+        blog_source.add_urls(list(lastmods))
+
+    scheduler = RefreshScheduler(
+        content_processor, data_store, ledger, ai_interface,
+        lexical_index=lexical_index,
+        lexical_save_interval=config.LEXICAL_SAVE_INTERVAL,
+        host_limiter=HostLimiter(config.HOST_MIN_INTERVAL, config.HOST_MAX_CONCURRENT),
+        fetch_workers=config.REFRESH_FETCH_WORKERS,
+        age_half_life=config.REFRESH_AGE_HALF_LIFE,
+        min_interval=config.REFRESH_MIN_INTERVAL
+    )
+    stats = scheduler.run(
+        blog_source.load_urls(), records, lastmods,
+        max_urls=max_urls, max_seconds=max_seconds, max_tokens=max_tokens
+    )
+
+    log_ledger_status(ledger)
+    finish_boilerplate(boilerplate_model, content_processor)
+    log_token_usage(ai_interface)
+    return stats
+
+def get_date_filter():
+    """Return the configured (start_date, end_date) filter, or (None, None) when disabled"""
+    if not config.DATE_RANGE_FILTER_ENABLED:
+        return None, None
+    return config.START_DATE, config.END_DATE or get_current_date_string()
+
+def reshard_data(shard_by):
+    """Copy every record from the single-file store into shards"""
+    source = DataStore(config.STORAGE_FILE)
+    target = DataStore(config.STORAGE_FILE, shard_by=shard_by)
+
+    records = source.load_all_data()
+    if not target.save_many_blog_data(records):
+        return False
+
+    logger.info(f"Wrote {len(records)} records into {len(target.get_shard_keys())} shards under {target.shard_dir}")
+    return True
+
+def reembed_summaries(model, cutover=False):
+    """Re-embed stored summaries with the given model, optionally cutting search over to it"""
+    embedding_service = EmbeddingService(config.VOYAGE_API_KEY, model)
+    data_store = DataStore(config.STORAGE_FILE, shard_by=config.SHARD_BY)
+
+    reembedder = Reembedder(embedding_service, data_store, batch_size=config.REEMBED_BATCH_SIZE)
+    updated = reembedder.run()
+
+    if cutover:
+        data_store.cutover_embedding_model(model)
+    return updated
+
+def build_lexical_index():
+    """Rebuild the BM25 index from every stored post"""
+    data_store = DataStore(config.STORAGE_FILE, shard_by=config.SHARD_BY)
+    lexical_index = LexicalIndex(config.LEXICAL_INDEX_DIR)
+    lexical_index.rebuild(data_store.load_all_data())
+    if not lexical_index.save():
+        return False
+    # Rankings cached against the old index are stale even though no post changed
+    data_store.bump_corpus_version()
+    return True
+
+def build_retriever(cache=None):
+    """Build the retriever and the components it searches"""
+    embedding_service = EmbeddingService(config.VOYAGE_API_KEY, config.VOYAGE_MODEL)
+    data_store = DataStore(config.STORAGE_FILE, shard_by=config.SHARD_BY)
+    return Retriever(
+        QueryProcessor(embedding_service),
+        SimilarityEngine(
+            data_store,
+            max_workers=config.SEARCH_WORKERS,
+            mmr_lambda=config.MMR_LAMBDA,
+            duplicate_threshold=config.DUPLICATE_THRESHOLD,
+            topic_clusters=config.TOPIC_CLUSTERS
+        ),
+        LexicalIndex(config.LEXICAL_INDEX_DIR),
+        data_store,
+        hybrid_candidates=config.HYBRID_CANDIDATES,
+        cache=cache,
+        diversity_candidates=config.DIVERSITY_CANDIDATES
+    )
+
+def load_retrieval_cache(use_cache=True):
+    """Load the persistent retrieval cache, or return None when caching is off"""
+    if not use_cache:
+        return None
+    return RetrievalCache(config.RETRIEVAL_CACHE_FILE, max_entries=config.RETRIEVAL_CACHE_SIZE)
+
+def retrieve_posts(query_text, top_n=10, mode=config.RETRIEVAL_MODE, cache=None):
+    """Find the posts relevant to a query without summarizing them"""
+    start_date, end_date = get_date_filter()
+    return build_retriever(cache).retrieve(query_text, top_n, mode, start_date, end_date)
+
+def generate_topic_summary(query_text, top_n=10, mode=config.RETRIEVAL_MODE, use_cache=True):
     """Generate a summary of blogs relevant to the given topic"""
     logger.info(f"Generating topic summary for query: {query_text}")
 
     # Initialize components
     ai_interface = AIInterface(config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL)
-    embedding_service = EmbeddingService(config.VOYAGE_API_KEY, config.VOYAGE_MODEL)
-    data_store = DataStore(config.STORAGE_FILE)
-    query_processor = QueryProcessor(embedding_service)
-    similarity_engine = SimilarityEngine(data_store)
     summary_generator = SummaryGenerator(ai_interface, config.OUTPUT_DIR)
+    cache = load_retrieval_cache(use_cache)
 
     try:
-        # Process the query and get its embedding
-        query_data = query_processor.process_query(query_text)
-
-        # Find similar posts
-        relevant_posts = similarity_engine.find_similar_posts(
-            query_data["embedding"], 
-            top_n=top_n
-        )
+        # Find relevant posts
+        relevant_posts = retrieve_posts(query_text, top_n=top_n, mode=mode, cache=cache)
 
         if not relevant_posts:
             logger.warning("No relevant posts found for the query")
             return {"error": "No relevant posts found for the query"}
 
+        # Reuse the summary when the same posts, unchanged since, were summarized for this query
+        summary = None
+        summary_key = None
+        if cache and config.SUMMARY_CACHE_ENABLED:
+            summary_key = cache_key(
+                " ".join(query_text.split()), config.ANTHROPIC_MODEL,
+                [(post.get("url"), post.get("processedDate"), post.get("topic")) for post in relevant_posts]
+            )
+            summary = cache.get_summary(summary_key)
+            if summary:
+                logger.info("Ranked posts are unchanged; reusing the cached summary")
+
         # Generate comprehensive summary
-        summary = summary_generator.generate_summary(relevant_posts, query_text)
+        if not summary:
+            summary = summary_generator.generate_summary(relevant_posts, query_text)
+            if summary_key and not summary.startswith("Error generating"):
+                cache.put_summary(summary_key, summary)
+
+        log_token_usage(ai_interface)
 
         # Save summary to file
         output_file = summary_generator.save_summary(summary, query_text)
@@ -98,6 +337,15 @@ def generate_topic_summary(query_text, top_n=10):
         logger.error(f"Error generating topic summary: {str(e)}")
         return {"error": str(e)}
 
+def print_relevant_posts(posts):
+    """Print ranked posts with their retrieval scores"""
+    if not posts:
+        print("No relevant posts found for the query")
+        return
+    for i, post in enumerate(posts, 1):
+        print(f"{i}. {post.get('title')} (Score: {post.get('similarity_score', 0):.4f})")
+        print(f"   {post.get('url')}")
+
 def main():
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description='AI Blog Post Summarizer with Embeddings')
@@ -107,15 +355,75 @@ def main():
     process_parser = subparsers.add_parser("process", help="Process blogs from URL file")
     process_parser.add_argument("--force-refresh", action="store_true",
                         help="Process all URLs even if already processed")
+    process_parser.add_argument("--batch", action="store_true",
+                        help="Summarize pending URLs through the Message Batches API")
+    process_parser.add_argument("--retry-failed", action="store_true",
+                        help="Retry failed URLs now instead of waiting for their backoff")
+
+    # Refresh command
+    refresh_parser = subparsers.add_parser("refresh", help="Discover new posts and re-check stale ones within a budget")
+    refresh_parser.add_argument("--max-urls", type=int, default=config.REFRESH_MAX_URLS,
+                        help="Most URLs to check this run")
+    refresh_parser.add_argument("--max-seconds", type=int, default=config.REFRESH_MAX_SECONDS,
+                        help="Stop starting new URLs after this many seconds")
+    refresh_parser.add_argument("--max-tokens", type=int, default=config.REFRESH_MAX_TOKENS,
+                        help="Stop starting new URLs after spending this many Claude tokens")
+    refresh_parser.add_argument("--no-discover", action="store_true",
+                        help="Only re-check URLs already in the URL file")
+
+    # Status command
+    subparsers.add_parser("status", help="Show ingestion progress and the retry queue")
 
     # Generate summary command
     summary_parser = subparsers.add_parser("summarize", help="Generate topic summary")
     summary_parser.add_argument("query", help="Topic query for finding relevant posts")
     summary_parser.add_argument("--top", type=int, default=config.MAX_POSTS_IN_SUMMARY, 
                          help="Number of top posts to include")
+    summary_parser.add_argument("--mode", choices=RETRIEVAL_MODES, default=config.RETRIEVAL_MODE,
+                         help="Retrieve posts by embeddings, BM25 keywords, or both")
+    summary_parser.add_argument("--retrieve-only", action="store_true",
+                         help="List the relevant posts without generating a summary")
+    summary_parser.add_argument("--no-cache", action="store_true",
+                         help="Recompute the ranking and summary instead of reusing cached ones")
+
+    # Index command
+    subparsers.add_parser("index", help="Rebuild the keyword (BM25) index from stored posts")
+
+    # Re-embed command
+    reembed_parser = subparsers.add_parser("reembed", help="Re-embed stored summaries with a new embedding model")
+    reembed_parser.add_argument("--model", default=config.VOYAGE_MODEL,
+                         help="Embedding model to add vectors for")
+    reembed_parser.add_argument("--cutover", action="store_true",
+                         help="Make the model the primary embedding and drop other models' vectors")
+
+    # Reshard command
+    reshard_parser = subparsers.add_parser("reshard", help="Split the single-file store into shards")
+    reshard_parser.add_argument("--by", choices=SHARD_MODES, default="domain_month",
+                         help="How to partition records into shards")
+
+    # Boilerplate command
+    subparsers.add_parser("boilerplate", help="Learn site boilerplate from stored posts and report savings")
 
     args = parser.parse_args()
 
+    # Local-only commands need no API keys
+    if args.command == "reshard":
+        reshard_data(args.by)
+        return
+    if args.command == "boilerplate":
+        learn_boilerplate()
+        return
+    if args.command == "index":
+        build_lexical_index()
+        return
+    if args.command == "status":
+        show_ingest_status()
+        return
+    if args.command == "summarize" and args.retrieve_only and args.mode == "lexical":
+        cache = load_retrieval_cache(not args.no_cache)
+        print_relevant_posts(retrieve_posts(args.query, top_n=args.top, mode=args.mode, cache=cache))
+        return
+
     # Check for API keys
     if not config.ANTHROPIC_API_KEY:
         logger.error("Anthropic API key not found. Please set ANTHROPIC_API_KEY in your environment or .env file.")
@@ -127,9 +435,16 @@ def main():
 
     # Execute command
     if args.command == "process":
-        process_blogs(args.force_refresh)
+        process_blogs(args.force_refresh, batch=args.batch, retry_failed=args.retry_failed)
+    elif args.command == "refresh":
+        refresh_blogs(args.max_urls, args.max_seconds, args.max_tokens, discover=not args.no_discover)
+    elif args.command == "reembed":
+        reembed_summaries(args.model, cutover=args.cutover)
+    elif args.command == "summarize" and args.retrieve_only:
+        cache = load_retrieval_cache(not args.no_cache)
+        print_relevant_posts(retrieve_posts(args.query, top_n=args.top, mode=args.mode, cache=cache))
     elif args.command == "summarize":
-        result = generate_topic_summary(args.query, top_n=args.top)
+        result = generate_topic_summary(args.query, top_n=args.top, mode=args.mode, use_cache=not args.no_cache)
 
         if "success" in result:
             print(f"\nSummary generated successfully!\nOutput file: {result['output_file']}")
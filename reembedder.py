@@ -0,0 +1,57 @@
+# reembedder.py
+from data_store import record_embeddings
+from utils import logger
+
+class Reembedder:
+    """Re-embed stored summaries with a new embedding model, alongside the existing vectors
+
+    Progress is saved after every batch, and records that already have a vector
+    for the target model are skipped, so an interrupted run resumes where it stopped.
+    Vectors left stale by a re-ingest that changed the summary are redone.
+    """
+
+    def __init__(self, embedding_service, data_store, batch_size=128):
+        self.embedding_service = embedding_service
+        self.data_store = data_store
+        self.batch_size = batch_size
+
+    def pending_records(self, records):
+        """Return records with a summary but no current vector for the target model"""
+        model = self.embedding_service.model
+        return [
+            post for post in records
+            if post.get("summary")
+            and (model not in record_embeddings(post) or model in post.get("staleEmbeddings", []))
+        ]
+
+    def run(self):
+        """Re-embed every pending record; returns the number of records updated"""
+        model = self.embedding_service.model
+        updated = 0
+
+        for key in self.data_store.get_shard_keys():
+            pending = self.pending_records(self.data_store.load_shard(key))
+            if not pending:
+                continue
+
+            logger.info(f"Re-embedding {len(pending)} records with {model}")
+            for i in range(0, len(pending), self.batch_size):
+                batch = pending[i:i + self.batch_size]
+                embeddings, _ = self.embedding_service.batch_generate_embeddings(
+                    [post["summary"] for post in batch],
+                    batch_size=self.batch_size
+                )
+
+                for post, embedding in zip(batch, embeddings):
+                    post.setdefault("embeddings", {})[model] = embedding
+                    stale = [name for name in post.pop("staleEmbeddings", []) if name != model]
+                    if stale:
+                        post["staleEmbeddings"] = stale
+
+                if not self.data_store.save_many_blog_data(batch):
+                    raise Exception(f"Failed to save re-embedded records for {model}")
+                updated += len(batch)
+                logger.info(f"Re-embedded {updated} records so far")
+
+        logger.info(f"Re-embedded {updated} records with {model}")
+        return updated
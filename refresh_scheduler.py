@@ -0,0 +1,214 @@
+# refresh_scheduler.py
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+from utils import logger
+
+class HostLimiter:
+    """Per-host politeness: a cap on concurrent requests and a minimum gap between request starts"""
+
+    def __init__(self, min_interval=1.0, max_concurrent=2):
+        self.min_interval = min_interval
+        self.max_concurrent = max_concurrent
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_start = {}
+
+    @contextmanager
+    def slot(self, url):
+        """Hold a request slot for the URL's host, waiting for its turn"""
+        host = urlparse(url).netloc
+        with self.lock:
+            semaphore = self.semaphores.setdefault(host, threading.BoundedSemaphore(self.max_concurrent))
+
+        with semaphore:
+            with self.lock:
+                now = time.monotonic()
+                start = max(now, self.next_start.get(host, now))
+                self.next_start[host] = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+def days_since(timestamp, now):
+    """Return the days between an ISO date/timestamp and now, or None if it cannot be parsed"""
+    try:
+        return max(0.0, (now - datetime.fromisoformat(timestamp)).total_seconds() / 86400)
+    except (TypeError, ValueError):
+        return None
+
+class RefreshScheduler:
+    """Re-check stored posts and ingest new ones in priority order, within a per-run budget
+
+    Unfinished or newly discovered URLs come first, then stored posts whose
+    feed lastmod is newer than our last check. The rest are ranked by days
+    since they were last checked, weighted by how often their content has
+    changed and decayed by post age, so recent posts are revisited often and
+    old ones rarely. Pages are fetched concurrently under per-host limits;
+    unchanged pages cost no Claude or Voyage calls.
+    """
+
+    def __init__(self, content_processor, data_store, ledger, ai_interface, lexical_index=None,
+                 lexical_save_interval=20, host_limiter=None, fetch_workers=4, age_half_life=90, min_interval=1):
+        self.content_processor = content_processor
+        self.data_store = data_store
+        self.ledger = ledger
+        self.ai_interface = ai_interface
+        self.lexical_index = lexical_index
+        self.lexical_save_interval = lexical_save_interval
+        self.host_limiter = host_limiter or HostLimiter()
+        self.fetch_workers = fetch_workers
+        self.age_half_life = age_half_life  # days for a post's priority to halve
+        self.min_interval = min_interval  # days before a stored post is re-checked
+
+    def priority(self, url, post, lastmod, now):
+        """Return a sortable priority for a URL (higher first), or None if it is not due"""
+        entry = self.ledger.get(url)
+        if entry["state"] != "embedded" or not post:
+            if not self.ledger.should_process(url):
+                return None
+            return (2, lastmod or "")
+
+        last_checked = max(entry.get("checked") or "", post.get("processedDate") or "")
+        since = days_since(last_checked, now)
+        if since is None:
+            return (2, lastmod or "")
+        if lastmod and lastmod > last_checked:
+            return (1, lastmod)
+        if since < self.min_interval:
+            return None
+
+        # Laplace-smoothed share of checks that found changed content
+        change_rate = (entry.get("changes", 0) + 1) / (entry.get("checks", 0) + 2)
+        age = days_since(post.get("date"), now)
+        recency = 0.5 ** ((age or 0.0) / self.age_half_life)
+        return (0, since * change_rate * recency)
+
+    def build_queue(self, urls, records, lastmods=None, limit=None):
+        """Return up to limit due URLs, highest priority first"""
+        lastmods = lastmods or {}
+        posts = {post.get("url"): post for post in records}
+        now = datetime.now()
+
+        due = []
+        for url in dict.fromkeys(urls):
+            priority = self.priority(url, posts.get(url), lastmods.get(url), now)
+            if priority is not None:
+                due.append((priority, url))
+
+        limit = len(due) if limit is None else limit
+        return [url for _, url in heapq.nlargest(limit, due, key=lambda item: item[0])]
+
+    def tokens_used(self):
+        """Return the Claude tokens spent so far this run"""
+        usage = self.ai_interface.get_usage()
+        return usage["input_tokens"] + usage["output_tokens"] + usage["cache_creation_input_tokens"]
+
+    def fetch(self, url):
+        """Fetch a page under the host limiter; URLs with a checkpointed post need no fetch"""
+        if self.ledger.get(url).get("prepared"):
+            return None
+        with self.host_limiter.slot(url):
+            return self.content_processor.fetch_content(url)
+
+    def run(self, urls, records, lastmods=None, max_urls=None, max_seconds=None, max_tokens=None):
+        """Refresh the highest-priority URLs until the queue or a budget runs out
+
+        Returns counts of URLs checked, found unchanged, (re)ingested and failed.
+        """
+        queue = self.build_queue(urls, records, lastmods, limit=max_urls)
+        logger.info(f"Refresh queue: {len(queue)} URLs due")
+
+        stored = {post.get("url") for post in records}
+        stats = {"checked": 0, "unchanged": 0, "ingested": 0, "failed": 0}
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        tokens_at_start = self.tokens_used()
+
+        def over_budget():
+            if deadline and time.monotonic() >= deadline:
+                logger.info("Refresh time budget reached")
+                return True
+            if max_tokens and self.tokens_used() - tokens_at_start >= max_tokens:
+                logger.info("Refresh token budget reached")
+                return True
+            return False
+
+        pending = iter(queue)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            def submit_next():
+                for url in pending:
+                    in_flight[executor.submit(self.fetch, url)] = url
+                    return
+
+            for _ in range(self.fetch_workers * 2):
+                submit_next()
+
+            within_budget = True
+            while in_flight and within_budget:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    within_budget = within_budget and not over_budget()
+                    url = in_flight.pop(future)
+                    if not within_budget:
+                        continue
+                    stats[self.refresh_url(url, future.result(), url in stored)] += 1
+                    stats["checked"] += 1
+                    submit_next()
+
+            # Drop fetches queued past the budget
+            for future in in_flight:
+                future.cancel()
+
+        if self.lexical_index:
+            self.lexical_index.save()
+        logger.info(
+            f"Refresh checked {stats['checked']} URLs: {stats['ingested']} ingested, "
+            f"{stats['unchanged']} unchanged, {stats['failed']} failed"
+        )
+        return stats
+
+    def refresh_url(self, url, html_content, is_stored):
+        """Re-ingest a fetched page if it is new or its content changed; return the outcome"""
+        entry = self.ledger.get(url)
+        prepared = None
+        if not entry.get("prepared"):
+            if not html_content:
+                if is_stored and entry["state"] == "embedded":
+                    # Keep the stored post; it stays at the top of the queue for next run
+                    logger.warning(f"Could not fetch {url}; keeping the stored version")
+                else:
+                    self.ledger.mark_failed(url, "Could not fetch content")
+                return "failed"
+
+            prepared = self.content_processor.prepare_from_html(url, html_content)
+            if not prepared:
+                self.ledger.mark_failed(url, "Could not extract content")
+                return "failed"
+
+            if is_stored and entry["state"] == "embedded":
+                previous_hash = entry.get("content_hash")
+                changed = bool(previous_hash) and previous_hash != prepared["content_hash"]
+                # Posts ingested before hashes were recorded take this fetch as their baseline
+                self.ledger.record_check(url, prepared["content_hash"], changed)
+                if not changed:
+                    return "unchanged"
+                logger.info(f"Content changed: {url}")
+
+        blog_data = self.content_processor.process_blog_with_checkpoints(url, self.ledger, prepared)
+        if not blog_data:
+            return "failed"
+
+        if not self.data_store.save_blog_data(blog_data):
+            self.ledger.mark_failed(url, "Could not save to the data store")
+            return "failed"
+
+        if self.lexical_index:
+            self.lexical_index.add_document(blog_data)
+            self.lexical_index.save_if_due(self.lexical_save_interval)
+        self.ledger.mark(url, "embedded")
+        return "ingested"
@@ -0,0 +1,89 @@
+# retrieval_cache.py
+import hashlib
+import json
+import os
+from utils import logger
+
+def cache_key(*parts):
+    """Hash JSON-serializable key parts into a cache key"""
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+class RetrievalCache:
+    """Persistent cache of ranked retrieval results and the summaries generated from them
+
+    Rankings are keyed on the query, its filters and the corpus version, so
+    any write to the store or change to the lexical index outside a write
+    makes older rankings unreachable; they are pruned
+    on save. Summaries are keyed on the query and the ranked posts' URLs and
+    processed dates, so they survive unrelated writes but not a changed
+    ranking or a re-processed post. Both maps are trimmed to the most
+    recently used max_entries.
+    """
+
+    def __init__(self, cache_file, max_entries=256):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.load()
+
+    def load(self):
+        """Load the cache, starting empty if it is missing or unreadable"""
+        self.rankings = {}
+        self.summaries = {}
+        try:
+            if os.path.exists(self.cache_file) and os.path.getsize(self.cache_file) > 0:
+                with open(self.cache_file, 'r') as f:
+                    data = json.load(f)
+                self.rankings = data.get("rankings", {})
+                self.summaries = data.get("summaries", {})
+        except Exception as e:
+            logger.error(f"Error loading retrieval cache: {e}")
+
+    def save(self, corpus_version=None):
+        """Persist the cache, dropping rankings from older corpus versions"""
+        if corpus_version is not None:
+            self.rankings = {
+                key: entry for key, entry in self.rankings.items()
+                if entry["corpus_version"] == corpus_version
+            }
+        try:
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump({"rankings": self.rankings, "summaries": self.summaries}, f)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logger.error(f"Error saving retrieval cache: {e}")
+
+    def touch(self, entries, key):
+        """Move an entry to the most recently used end, evicting the oldest beyond max_entries"""
+        entries[key] = entries.pop(key)
+        while len(entries) > self.max_entries:
+            del entries[next(iter(entries))]
+
+    def get_ranking(self, key):
+        """Return the cached [(url, score, ...), ...] ranking for a key, or None"""
+        if key not in self.rankings:
+            return None
+        self.touch(self.rankings, key)
+        return [tuple(hit) for hit in self.rankings[key]["hits"]]
+
+    def put_ranking(self, key, hits, corpus_version):
+        """Cache a ranking computed at the given corpus version"""
+        self.rankings[key] = {
+            "hits": [[url, float(score), *extra] for url, score, *extra in hits],
+            "corpus_version": corpus_version
+        }
+        self.touch(self.rankings, key)
+        self.save(corpus_version)
+
+    def get_summary(self, key):
+        """Return a cached summary, or None"""
+        if key not in self.summaries:
+            return None
+        self.touch(self.summaries, key)
+        return self.summaries[key]
+
+    def put_summary(self, key, summary):
+        """Cache a generated summary"""
+        self.summaries[key] = summary
+        self.touch(self.summaries, key)
+        self.save()
@@ -0,0 +1,150 @@
+# retriever.py
+from lexical_index import reciprocal_rank_fusion
+from retrieval_cache import cache_key
+from utils import logger
+
+RETRIEVAL_MODES = ("lexical", "vector", "hybrid")
+
+class Retriever:
+    """Find posts relevant to a query by vector similarity, BM25 keywords or both"""
+
+    def __init__(self, query_processor, similarity_engine, lexical_index, data_store, hybrid_candidates=50,
+                 cache=None, diversity_candidates=0):
+        self.query_processor = query_processor
+        self.similarity_engine = similarity_engine
+        self.lexical_index = lexical_index
+        self.data_store = data_store
+        self.hybrid_candidates = hybrid_candidates
+        self.cache = cache
+        # Candidates re-ranked for diversity before the top N are kept; 0 disables re-ranking
+        self.diversity_candidates = diversity_candidates
+
+    def retrieve(self, query_text, top_n=10, mode="vector", start_date=None, end_date=None):
+        """Return the top N posts for the query, each with a similarity_score
+
+        Lexical mode makes no network calls. Hybrid mode fuses the vector and
+        lexical rankings with reciprocal-rank fusion. With diversity_candidates
+        set, vector mode re-ranks that many candidates by maximal marginal
+        relevance and drops near-duplicates. With a cache, a ranking
+        computed at the current corpus version is reused, skipping the query
+        embedding and the similarity scan.
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if not self.cache:
+            return self.rank(query_text, top_n, mode, start_date, end_date)
+
+        corpus_version = self.data_store.get_corpus_version()
+        key = cache_key(
+            self.query_processor.clean_query(query_text), top_n, mode, start_date, end_date,
+            self.query_processor.embedding_service.model, corpus_version, self.diversity_settings(mode)
+        )
+        hits = self.cache.get_ranking(key)
+        if hits is not None:
+            posts = self.load_ranked_posts(hits)
+            if len(posts) == len(hits):
+                logger.info(f"Using cached ranking of {len(posts)} posts")
+                return posts
+
+        posts = self.rank(query_text, top_n, mode, start_date, end_date)
+        # Empty results may come from a failed search, so they are not cached
+        if posts:
+            hits = [(post["url"], post["similarity_score"], post.get("topic")) for post in posts]
+            self.cache.put_ranking(key, hits, corpus_version)
+        return posts
+
+    def diversity_settings(self, mode):
+        """Return the re-ranking settings that shape a ranking in this mode, for cache keys"""
+        if not self.diversifies(mode):
+            return None
+        engine = self.similarity_engine
+        return [self.diversity_candidates, engine.mmr_lambda, engine.duplicate_threshold, engine.topic_clusters]
+
+    def load_ranked_posts(self, hits):
+        """Load the posts for ranked (url, score[, topic]) hits, setting each post's similarity_score"""
+        records = self.data_store.find_records([hit[0] for hit in hits])
+
+        posts = []
+        for url, score, *topic in hits:
+            if url in records:
+                post = records[url]
+                post["similarity_score"] = score
+                if topic and topic[0]:
+                    post["topic"] = topic[0]
+                posts.append(post)
+        return posts
+
+    def diversifies(self, mode):
+        """Return whether rankings in this mode are re-ranked for diversity
+
+        Only vector scores are cosine similarities that MMR can weigh against
+        the posts' similarity to each other; BM25 and fused scores are not,
+        and exact-match keyword queries want their best matches kept.
+        """
+        return bool(self.diversity_candidates) and mode == "vector"
+
+    def rank(self, query_text, top_n=10, mode="vector", start_date=None, end_date=None):
+        """Run retrieval in the given mode without consulting the cache"""
+        if not self.diversifies(mode):
+            return self.rank_candidates(query_text, top_n, mode, start_date, end_date)
+
+        query_data = self.query_processor.process_query(query_text)
+        posts, positions = self.similarity_engine.find_similar_posts(
+            query_data["embedding"],
+            top_n=max(top_n, self.diversity_candidates),
+            start_date=start_date,
+            end_date=end_date,
+            model=query_data["model"],
+            with_positions=True
+        )
+        return self.similarity_engine.diversify_posts(posts, top_n, positions, query_data["model"])
+
+    def rank_candidates(self, query_text, top_n, mode, start_date=None, end_date=None):
+        """Return the top N posts for the query in the given mode"""
+        if mode == "lexical":
+            clean_query = self.query_processor.clean_query(query_text)
+            return self.find_lexical_posts(clean_query, top_n, start_date, end_date)
+
+        query_data = self.query_processor.process_query(query_text)
+        candidates = top_n if mode == "vector" else max(top_n, self.hybrid_candidates)
+        vector_posts = self.similarity_engine.find_similar_posts(
+            query_data["embedding"],
+            top_n=candidates,
+            start_date=start_date,
+            end_date=end_date,
+            model=query_data["model"]
+        )
+        if mode == "vector":
+            return vector_posts
+
+        lexical_hits = self.lexical_index.search(query_data["clean_query"], candidates, start_date, end_date)
+        fused = reciprocal_rank_fusion([
+            [post["url"] for post in vector_posts],
+            [url for url, _ in lexical_hits]
+        ])[:top_n]
+
+        posts_by_url = {post["url"]: post for post in vector_posts}
+        missing = [url for url, _ in fused if url not in posts_by_url]
+        if missing:
+            posts_by_url.update(self.data_store.find_records(missing))
+
+        posts = []
+        for url, score in fused:
+            if url in posts_by_url:
+                post = posts_by_url[url]
+                post["similarity_score"] = score
+                posts.append(post)
+        return posts
+
+    def find_lexical_posts(self, clean_query, top_n, start_date=None, end_date=None):
+        """Return the top N BM25 matches as posts, scored by BM25"""
+        indexed = self.lexical_index.document_count()
+        if not indexed:
+            logger.warning("Lexical index is empty; run the index command to build it")
+            return []
+        stored = self.data_store.count_records()
+        if indexed < stored:
+            logger.warning(f"Lexical index covers {indexed} of {stored} stored posts; run the index command to rebuild it")
+
+        hits = self.lexical_index.search(clean_query, top_n, start_date, end_date)
+        return self.load_ranked_posts(hits)
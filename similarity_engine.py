@@ -1,53 +1,212 @@
+import heapq
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from utils import logger
 
+def maximal_marginal_relevance(relevance, similarity, top_n, mmr_lambda=0.7, duplicate_threshold=None):
+    """Pick up to top_n candidate indices balancing relevance against redundancy
+
+    relevance holds each candidate's cosine similarity to the query and
+    similarity the candidates' pairwise cosine similarities. Both are used
+    as they are, so mmr_lambda trades off quantities on the same scale and
+    a strong match is never outweighed just because the candidates' scores
+    are bunched together. Candidates whose similarity to an already picked
+    one reaches duplicate_threshold are dropped, so fewer than top_n may be
+    returned.
+    """
+    n = len(relevance)
+    relevance = np.asarray(relevance, dtype=float)
+
+    selected = []
+    available = np.ones(n, dtype=bool)
+    closest = np.zeros(n)  # similarity to the nearest selected candidate
+    while len(selected) < top_n and available.any():
+        scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * closest, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        closest = np.maximum(closest, similarity[best])
+        if duplicate_threshold is not None:
+            available &= similarity[best] < duplicate_threshold
+    return selected
+
 class SimilarityEngine:
     """Engine to calculate similarity between embeddings and find relevant posts"""
 
-    def __init__(self, vector_store):
+    def __init__(self, vector_store, max_workers=4, mmr_lambda=0.7, duplicate_threshold=None, topic_clusters=None):
         self.vector_store = vector_store
+        self.max_workers = max_workers
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.topic_clusters = topic_clusters
 
-    def find_similar_posts(self, query_embedding, top_n=10):
-        """Find the top N most similar posts to the query embedding"""
-        try:
-            # Load all blog data
-            all_posts = self.vector_store.load_all_data()
+    def find_similar_posts(self, query_embedding, top_n=10, start_date=None, end_date=None, model=None,
+                           with_positions=False):
+        """Find the top N most similar posts to the query embedding
 
-            if not all_posts:
+        Each shard overlapping the date filter is searched in parallel and the
+        per-shard top N candidates are merged with a heap. Only vectors from
+        the query's embedding model are compared. With with_positions, returns
+        the posts and their (shard, row) positions, for diversify_posts.
+        """
+        try:
+            shard_keys = self.vector_store.get_shard_keys(start_date, end_date)
+            if not shard_keys:
                 logger.warning("No posts found in vector store")
-                return []
-
-            # Calculate similarities for posts that have embeddings
-            similarities = []
-            for i, post in enumerate(all_posts):
-                if "embedding" in post:
-                    similarity = self.calculate_cosine_similarity(
-                        query_embedding, 
-                        post["embedding"]
-                    )
-                    similarities.append((i, similarity))
-
-            if not similarities:
-                logger.warning("No posts with embeddings found")
-                return []
+                return ([], []) if with_positions else []
 
-            # Sort by similarity (highest first)
-            similarities.sort(key=lambda x: x[1], reverse=True)
+            query_vec = np.asarray(query_embedding, dtype=float)
 
-            # Get top N posts
-            top_indices = [idx for idx, _ in similarities[:top_n]]
-            top_posts = [all_posts[idx] for idx in top_indices]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                shard_results = list(executor.map(
+                    lambda key: self.search_shard(key, query_vec, top_n, start_date, end_date, model),
+                    shard_keys
+                ))
+
+            candidates = [hit for hits in shard_results for hit in hits]
+            if not candidates:
+                logger.warning("No posts with embeddings found")
+                return ([], []) if with_positions else []
 
-            # Add similarity scores to posts
-            for i, (idx, score) in enumerate(similarities[:top_n]):
-                top_posts[i]["similarity_score"] = score
+            # Merge per-shard candidates, highest similarity first
+            top_hits = heapq.nlargest(top_n, candidates, key=lambda hit: hit[0])
+            top_posts = self.load_hits(top_hits)
 
             logger.info(f"Found {len(top_posts)} relevant posts")
+            if with_positions:
+                return top_posts, [(key, row) for _, key, row in top_hits]
             return top_posts
         except Exception as e:
             logger.error(f"Error finding similar posts: {str(e)}")
+            return ([], []) if with_positions else []
+
+    def search_shard(self, key, query_vec, top_n, start_date=None, end_date=None, model=None):
+        """Score one shard against the query, returning its top N (score, shard, row) hits
+
+        Only the shard's embedding matrix (and date column when filtering) is read.
+        """
+        matrix = self.vector_store.load_shard_embeddings(key, model)
+        if matrix.size == 0 or matrix.shape[1] != query_vec.shape[0]:
             return []
 
+        scores = self.calculate_cosine_similarities(query_vec, matrix)
+
+        if start_date or end_date:
+            dates = self.vector_store.load_shard_dates(key)
+            if start_date:
+                scores[dates < start_date] = -np.inf
+            if end_date:
+                scores[dates > end_date] = -np.inf
+
+        valid = np.flatnonzero(np.isfinite(scores))
+        if len(valid) > top_n:
+            valid = valid[np.argpartition(-scores[valid], top_n)[:top_n]]
+
+        return [(float(scores[i]), key, int(i)) for i in valid]
+
+    def load_hits(self, hits):
+        """Load the records for ranked (score, shard, row) hits, preserving their order"""
+        rows_by_shard = {}
+        for _, key, row in hits:
+            rows_by_shard.setdefault(key, []).append(row)
+
+        records = {}
+        for key, rows in rows_by_shard.items():
+            for row, post in zip(rows, self.vector_store.read_shard_records(key, rows)):
+                records[(key, row)] = post
+
+        top_posts = []
+        for score, key, row in hits:
+            post = records[(key, row)]
+            post["similarity_score"] = score
+            top_posts.append(post)
+        return top_posts
+
+    def load_post_vectors(self, positions, model=None):
+        """Gather the embeddings at (shard, row) positions from the memory-mapped matrices as unit rows
+
+        With no model, each shard's primary model is used. Rows without a
+        vector of the common dimension are zero.
+        """
+        rows_by_shard = {}
+        for i, (key, row) in enumerate(positions):
+            rows_by_shard.setdefault(key, []).append((i, row))
+
+        vectors = np.zeros((len(positions), 0), dtype=np.float32)
+        for key, pairs in rows_by_shard.items():
+            matrix = self.vector_store.load_shard_embeddings(key, model)
+            if matrix.size == 0:
+                continue
+            if vectors.shape[1] == 0:
+                vectors = np.zeros((len(positions), matrix.shape[1]), dtype=np.float32)
+            if matrix.shape[1] != vectors.shape[1]:
+                continue
+            indices, rows = zip(*pairs)
+            vectors[list(indices)] = matrix[np.array(rows)]
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def diversify_posts(self, posts, top_n, positions, model=None):
+        """Re-rank candidates scored by cosine similarity to the query with maximal marginal relevance
+
+        positions holds each post's (shard, row), as returned by
+        find_similar_posts, so vectors are read without looking posts up by
+        URL. Near-duplicates of a picked post are dropped, so fewer than top_n
+        posts may come back. With topic_clusters set, the picked posts are
+        grouped by k-means topic (each post gets a "topic" number) with topics
+        ordered by their best-ranked post.
+        """
+        if len(posts) < 2:
+            return posts[:top_n]
+
+        vectors = self.load_post_vectors(positions, model)
+        if vectors.shape[1] == 0:
+            return posts[:top_n]
+
+        similarity = vectors @ vectors.T
+        relevance = np.array([post.get("similarity_score", 0.0) for post in posts])
+        selected = maximal_marginal_relevance(
+            relevance, similarity, top_n, self.mmr_lambda, self.duplicate_threshold
+        )
+        logger.info(f"Diversified {len(posts)} candidates to {len(selected)} posts")
+
+        if self.topic_clusters and len(selected) > self.topic_clusters:
+            selected = self.group_by_topic(posts, vectors, selected)
+        return [posts[i] for i in selected]
+
+    def group_by_topic(self, posts, vectors, selected):
+        """Cluster the selected posts with k-means and order them topic by topic, labelling each post"""
+        from sklearn.cluster import KMeans
+
+        labels = KMeans(n_clusters=self.topic_clusters, n_init=10, random_state=0).fit_predict(vectors[selected])
+
+        # Topics are numbered in order of their best-ranked post; MMR order is kept within a topic
+        topic_order = list(dict.fromkeys(labels.tolist()))
+        grouped = sorted(range(len(selected)), key=lambda i: topic_order.index(labels[i]))
+        for i in grouped:
+            posts[selected[i]]["topic"] = topic_order.index(labels[i]) + 1
+        return [selected[i] for i in grouped]
+
+    def calculate_cosine_similarities(self, query_vec, matrix, chunk_size=4096):
+        """Calculate cosine similarity between the query and every row of an embedding matrix
+
+        The matrix is processed in row chunks so a memory-mapped matrix is never
+        copied whole. Rows with zero norm (missing embeddings) score -inf so they
+        are never returned.
+        """
+        query_vec = np.asarray(query_vec, dtype=matrix.dtype)
+        query_norm = np.linalg.norm(query_vec)
+        scores = np.full(matrix.shape[0], -np.inf)
+
+        for start in range(0, matrix.shape[0], chunk_size):
+            chunk = matrix[start:start + chunk_size]
+            norms = np.linalg.norm(chunk, axis=1) * query_norm
+            dots = chunk @ query_vec
+            nonzero = norms > 0
+            scores[start:start + chunk_size][nonzero] = dots[nonzero] / norms[nonzero]
+        return scores
+
     def calculate_cosine_similarity(self, query_embedding, post_embedding):
         """Calculate cosine similarity between query and post embedding"""
         try:
@@ -0,0 +1,20 @@
+import pytest
+
+def build_post(i, **fields):
+    """Build a stored blog record numbered i, with any fields overridden"""
+    post = {
+        "url": f"https://www.esri.com/arcgis-blog/products/p{i}/",
+        "title": f"What's new in product {i}",
+        "date": "2024-11-01",
+        "content": f"Release notes for product {i} with raster analysis",
+        "summary": f"Product {i} adds raster analysis",
+        "embedding": [1.0, float(i)],
+        "embeddingModel": "voyage-test",
+    }
+    post.update(fields)
+    return post
+
+@pytest.fixture
+def make_post():
+    """Factory for stored blog records: make_post(i, **fields)"""
+    return build_post
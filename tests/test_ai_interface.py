@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+from anthropic.types import Usage
+from ai_interface import AIInterface, SUMMARIZE_SYSTEM_PROMPT, COMPREHENSIVE_SYSTEM_PROMPT
+
+class FakeMessages:
+    """Stand-in for client.messages that records requests and replays canned usage"""
+
+    def __init__(self, usages):
+        self.usages = list(usages)
+        self.requests = []
+
+    def create(self, **params):
+        self.requests.append(params)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text="<THINKING>...</THINKING><SUMMARY>A summary.</SUMMARY>")],
+            usage=Usage.model_validate(self.usages.pop(0))
+        )
+
+def make_interface(usages):
+    ai = AIInterface("test-key")
+    ai.client = SimpleNamespace(messages=FakeMessages(usages))
+    return ai
+
+def test_summarize_system_prefix_is_identical_across_calls():
+    ai = make_interface([{"input_tokens": 10, "output_tokens": 5}] * 2)
+    ai.summarize_blog("First post body", "First", "https://example.com/1")
+    ai.summarize_blog("Second post body", "Second", "https://example.com/2")
+
+    first, second = ai.client.messages.requests
+    assert first["system"] == second["system"]
+    assert first["system"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert first["system"][-1]["text"] == SUMMARIZE_SYSTEM_PROMPT
+    # Only the user turn varies between posts
+    assert first["messages"] != second["messages"]
+
+def test_comprehensive_summary_sends_an_uncached_system_block():
+    ai = make_interface([{"input_tokens": 10, "output_tokens": 5}])
+    posts = [{"url": "https://example.com/1", "title": "One", "date": "2024-11-01", "summary": "S"}]
+    ai.generate_comprehensive_summary(posts, "topic")
+
+    system = ai.client.messages.requests[0]["system"]
+    assert system == [{"type": "text", "text": COMPREHENSIVE_SYSTEM_PROMPT}]
+
+def test_record_usage_accumulates_cache_fields():
+    ai = make_interface([
+        {"input_tokens": 200, "output_tokens": 50, "cache_creation_input_tokens": 1500, "cache_read_input_tokens": 0},
+        {"input_tokens": 180, "output_tokens": 40, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 1500},
+        {"input_tokens": 190, "output_tokens": 45},
+    ])
+    for i in range(3):
+        ai.summarize_blog("Body", f"Post {i}", f"https://example.com/{i}")
+
+    usage = ai.get_usage()
+    assert usage == {
+        "input_tokens": 570,
+        "output_tokens": 135,
+        "cache_creation_input_tokens": 1500,
+        "cache_read_input_tokens": 1500,
+        "requests": 3,
+    }
@@ -0,0 +1,196 @@
+import json
+import os
+from types import SimpleNamespace
+from anthropic.types import Usage
+from ai_interface import AIInterface
+from batch_processor import BatchProcessor
+from content_processor import BlogContentProcessor
+from data_store import DataStore
+from ingest_ledger import IngestLedger
+
+URLS = [f"https://www.esri.com/arcgis-blog/products/test/post-{i}/" for i in range(3)]
+
+def page(url):
+    body = " ".join(f"Paragraph about {url} and its release notes." for _ in range(10))
+    return (f"<html><head><title>Post {url[-3:]}</title>"
+            f"<meta property='article:published_time' content='2024-11-05'></head>"
+            f"<body><article><p>{body}</p></article></body></html>")
+
+class FakeBatches:
+    """Local stand-in for the Message Batches resource"""
+
+    def __init__(self, statuses=("in_progress", "ended"), failed_ids=()):
+        self.statuses = list(statuses)
+        self.failed_ids = set(failed_ids)
+        self.created = []
+        self.failed_creates = set()
+        self.retrieved = 0
+
+    def create(self, requests):
+        if len(self.created) in self.failed_creates:
+            raise Exception("batch rejected")
+        self.created.append(requests)
+        return SimpleNamespace(id=f"msgbatch_{len(self.created)}")
+
+    def retrieve(self, batch_id):
+        self.retrieved += 1
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return SimpleNamespace(id=batch_id, processing_status=status)
+
+    def results(self, batch_id):
+        requests = self.created[int(batch_id.split("_")[1]) - 1]
+        for request in requests:
+            if request["custom_id"] in self.failed_ids:
+                yield SimpleNamespace(custom_id=request["custom_id"], result=SimpleNamespace(type="errored"))
+                continue
+            message = SimpleNamespace(
+                content=[SimpleNamespace(text=f"<SUMMARY>Summary of {request['custom_id']}</SUMMARY>")],
+                usage=Usage(input_tokens=100, output_tokens=20)
+            )
+            yield SimpleNamespace(
+                custom_id=request["custom_id"],
+                result=SimpleNamespace(type="succeeded", message=message)
+            )
+
+class FakeEmbeddingService:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def batch_generate_embeddings(self, texts, batch_size=50):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise Exception("embedding service unavailable")
+        return [[1.0, float(i), 0.5] for i in range(len(texts))], "voyage-test"
+
+def make_processor(tmp_path, batches, embedding_service, ledger=None, fetched=None, **options):
+    ai = AIInterface("test-key")
+    ai.client = SimpleNamespace(messages=SimpleNamespace(batches=batches))
+    content_processor = BlogContentProcessor(ai, embedding_service)
+
+    def fetch_content(url):
+        if fetched is not None:
+            fetched.append(url)
+        return page(url)
+    content_processor.fetch_content = fetch_content
+
+    data_store = DataStore(str(tmp_path / "blog_data.json"))
+    processor = BatchProcessor(
+        ai, embedding_service, data_store, content_processor,
+        str(tmp_path / "batch_state.json"), poll_interval=0, ledger=ledger, **options
+    )
+    return processor, data_store
+
+def test_batch_flow_resumes_after_restart(tmp_path):
+    batches = FakeBatches(statuses=("in_progress", "in_progress", "ended"))
+    embedding_service = FakeEmbeddingService()
+
+    # First run submits, persists the batch and is interrupted before polling
+    processor, _ = make_processor(tmp_path, batches, embedding_service)
+    state = processor.submit(URLS)
+    assert state["batch_ids"] == ["msgbatch_1"]
+    assert os.path.exists(processor.state_file)
+    assert processor.load_state()["batch_ids"] == ["msgbatch_1"]
+
+    # A restarted run resumes the same batch instead of submitting a new one
+    processor, data_store = make_processor(tmp_path, batches, embedding_service)
+    stored = processor.run(URLS)
+
+    assert stored == len(URLS)
+    assert len(batches.created) == 1
+    assert batches.retrieved == 3
+    assert len(embedding_service.calls) == 1 and len(embedding_service.calls[0]) == len(URLS)
+    assert not os.path.exists(processor.state_file)
+
+    records = {post["url"]: post for post in data_store.load_all_data()}
+    assert set(records) == set(URLS)
+    custom_id = processor.make_custom_id(URLS[0])
+    assert records[URLS[0]]["summary"] == f"Summary of {custom_id}"
+    assert records[URLS[0]]["embeddingModel"] == "voyage-test"
+    assert processor.ai_interface.get_usage()["requests"] == len(URLS)
+
+def test_retry_after_embedding_failure_reuses_checkpoints(tmp_path):
+    ledger = IngestLedger(str(tmp_path / "ledger.json"))
+    batches = FakeBatches(statuses=("ended",))
+    fetched = []
+
+    processor, _ = make_processor(tmp_path, batches, FakeEmbeddingService(fail=True), ledger, fetched)
+    batches.failed_ids = {processor.make_custom_id(URLS[2])}
+    assert processor.run(URLS) == 0
+    assert len(fetched) == len(URLS)
+    entries = [ledger.get(url) for url in URLS]
+    assert [entry["state"] for entry in entries] == ["failed"] * 3
+    # Embedding failed after summarizing; the errored batch request failed after fetching
+    assert [entry["stage"] for entry in entries] == ["summarized", "summarized", "fetched"]
+    assert entries[0]["summary"] and "summary" not in entries[2]
+
+    # The retry fetches nothing and only resubmits the post that has no summary
+    embedding_service = FakeEmbeddingService()
+    batches.failed_ids = set()
+    processor, data_store = make_processor(tmp_path, batches, embedding_service, ledger, fetched)
+    assert processor.run(URLS) == len(URLS)
+
+    assert len(fetched) == len(URLS)
+    assert len(batches.created) == 2
+    assert [request["custom_id"] for request in batches.created[1]] == [processor.make_custom_id(URLS[2])]
+    assert sorted(embedding_service.calls[0]) == sorted(post["summary"] for post in data_store.load_all_data())
+    assert all(ledger.get(url)["state"] == "embedded" for url in URLS)
+
+def test_retry_with_every_summary_checkpointed_skips_the_batch(tmp_path):
+    ledger = IngestLedger(str(tmp_path / "ledger.json"))
+    batches = FakeBatches(statuses=("ended",))
+    processor, _ = make_processor(tmp_path, batches, FakeEmbeddingService(fail=True), ledger)
+    processor.run(URLS)
+
+    processor, _ = make_processor(tmp_path, batches, FakeEmbeddingService(), ledger)
+    assert processor.run(URLS) == len(URLS)
+    assert len(batches.created) == 1
+
+def test_large_runs_are_split_across_batches(tmp_path):
+    batches = FakeBatches(statuses=("ended",))
+    processor, _ = make_processor(tmp_path, batches, FakeEmbeddingService(), max_batch_requests=2)
+    state = processor.submit(URLS)
+    assert state["batch_ids"] == ["msgbatch_1", "msgbatch_2"]
+    assert [len(requests) for requests in batches.created] == [2, 1]
+    assert processor.load_state()["batch_ids"] == ["msgbatch_1", "msgbatch_2"]
+
+    processor, data_store = make_processor(tmp_path, batches, FakeEmbeddingService(), max_batch_requests=2)
+    assert processor.run(URLS) == len(URLS)
+    assert {post["url"] for post in data_store.load_all_data()} == set(URLS)
+
+def test_batches_are_split_by_request_size(tmp_path):
+    processor, _ = make_processor(tmp_path, FakeBatches(), FakeEmbeddingService())
+    requests = [{"custom_id": str(i), "params": {"text": "x" * 100}} for i in range(5)]
+    size = len(json.dumps(requests[0]))
+
+    processor.max_batch_bytes = size * 2
+    assert [len(chunk) for chunk in processor.split_requests(requests)] == [2, 2, 1]
+    # A request larger than the limit still goes out, alone
+    processor.max_batch_bytes = size - 1
+    assert [len(chunk) for chunk in processor.split_requests(requests)] == [1] * 5
+
+def test_rejected_batch_is_retried_from_checkpoints(tmp_path):
+    ledger = IngestLedger(str(tmp_path / "ledger.json"))
+    batches = FakeBatches(statuses=("ended",))
+    batches.failed_creates = {1}
+    fetched = []
+    processor, _ = make_processor(tmp_path, batches, FakeEmbeddingService(), ledger, fetched, max_batch_requests=2)
+    assert processor.run(URLS) == 2
+    assert ledger.get(URLS[2])["state"] == "failed"
+
+    batches.failed_creates = set()
+    processor, data_store = make_processor(tmp_path, batches, FakeEmbeddingService(), ledger, fetched,
+                                           max_batch_requests=2)
+    assert processor.run(URLS[2:]) == 1
+    assert len(fetched) == len(URLS)
+    assert {post["url"] for post in data_store.load_all_data()} == set(URLS)
+
+def test_single_batch_state_files_still_resume(tmp_path):
+    batches = FakeBatches(statuses=("ended",))
+    processor, data_store = make_processor(tmp_path, batches, FakeEmbeddingService())
+    state = processor.submit(URLS)
+    with open(processor.state_file, "w") as f:
+        json.dump({"batch_id": state["batch_ids"][0], "posts": state["posts"], "summarized": {}}, f)
+
+    assert processor.run(URLS) == len(URLS)
+    assert len(batches.created) == 1
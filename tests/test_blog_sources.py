@@ -0,0 +1,104 @@
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from blog_sources import BlogSourceHandler
+
+BLOG = "https://www.esri.com/arcgis-blog/"
+
+FEEDS = {
+    "/sitemap_index.xml": """<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>{base}/post-sitemap.xml</loc></sitemap>
+  <sitemap><loc>{base}/missing-sitemap.xml</loc></sitemap>
+</sitemapindex>""",
+    "/post-sitemap.xml": f"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>{BLOG}products/arcgis-pro/sitemap-post/</loc><lastmod>2024-10-01</lastmod></url>
+  <url><loc>{BLOG}products/arcgis-online/undated-post/</loc></url>
+  <url><loc>https://www.esri.com/en-us/about/</loc><lastmod>2024-10-02</lastmod></url>
+</urlset>""",
+    "/feed.xml": f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel>
+  <title>ArcGIS Blog</title>
+  <item><link>{BLOG}products/arcgis-pro/rss-post/</link><pubDate>Tue, 05 Nov 2024 14:30:00 +0000</pubDate></item>
+</channel></rss>""",
+    "/atom.xml": f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>ArcGIS Blog</title>
+  <entry><link href="{BLOG}products/arcgis-pro/atom-post/"/><updated>2024-11-06T09:15:00</updated></entry>
+</feed>""",
+    "/broken.xml": "<urlset><url><loc>",
+}
+
+@pytest.fixture
+def feed_server():
+    """Serve FEEDS from a local HTTP server and yield its base URL"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in FEEDS:
+                self.send_error(404)
+                return
+            body = FEEDS[self.path].format(base=base).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    base = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield base
+    server.shutdown()
+    server.server_close()
+
+def test_add_urls_to_file_without_trailing_newline(tmp_path):
+    source_file = tmp_path / "blog_urls.txt"
+    source_file.write_text(f"# Blog URLs\n{BLOG}first/\n{BLOG}last/")
+    handler = BlogSourceHandler(str(source_file))
+
+    assert handler.add_urls([f"{BLOG}last/", f"{BLOG}new/", f"{BLOG}new/"]) == [f"{BLOG}new/"]
+    assert handler.load_urls() == [f"{BLOG}first/", f"{BLOG}last/", f"{BLOG}new/"]
+    assert source_file.read_text().endswith(f"{BLOG}last/\n{BLOG}new/\n")
+
+def test_add_urls_to_empty_file(tmp_path):
+    source_file = tmp_path / "blog_urls.txt"
+    source_file.write_text("")
+    handler = BlogSourceHandler(str(source_file))
+
+    assert handler.add_urls([f"{BLOG}new/", "not a url"]) == [f"{BLOG}new/"]
+    assert source_file.read_text() == f"{BLOG}new/\n"
+
+def test_discover_urls_reads_sitemap_index_urlset_rss_and_atom(tmp_path, feed_server):
+    handler = BlogSourceHandler(str(tmp_path / "blog_urls.txt"))
+
+    discovered = handler.discover_urls(
+        [
+            f"{feed_server}/sitemap_index.xml",
+            f"{feed_server}/feed.xml",
+            f"{feed_server}/atom.xml",
+            f"{feed_server}/broken.xml",
+        ],
+        url_prefix=BLOG,
+    )
+
+    rss_date = datetime(2024, 11, 5, 14, 30, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert discovered == {
+        f"{BLOG}products/arcgis-pro/sitemap-post/": "2024-10-01T00:00:00",
+        f"{BLOG}products/arcgis-online/undated-post/": None,
+        f"{BLOG}products/arcgis-pro/rss-post/": rss_date.isoformat(),
+        f"{BLOG}products/arcgis-pro/atom-post/": "2024-11-06T09:15:00",
+    }
+
+def test_discover_urls_stops_at_max_sitemaps(tmp_path, feed_server):
+    handler = BlogSourceHandler(str(tmp_path / "blog_urls.txt"))
+
+    # The index uses the only fetch, so its child sitemaps are never read
+    assert handler.discover_urls([f"{feed_server}/sitemap_index.xml"], max_sitemaps=1) == {}
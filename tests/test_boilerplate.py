@@ -0,0 +1,49 @@
+from boilerplate import BoilerplateModel, HEADER_PATTERN
+
+FEATURES = ["time-aware playback", "snapping while sketching", "basemap restrictions", "extent filtering",
+            "attachment management", "table configuration", "oriented imagery", "KPI widgets",
+            "route analysis", "transit infographics", "scene layers"]
+
+def body(i):
+    """Page text that shares no six-word run with other pages"""
+    return " ".join(f"Release {i} item {n} brings {FEATURES[(i + n) % len(FEATURES)]}." for n in range(4))
+
+def blog_page(i, category="Imagery & Remote Sensing", authors="Jeff Swain and Ling Tang"):
+    return (f"ArcGIS Blog {category} Nov {10 + i}, 2024 What's new in Product {i} (November 2024) "
+            f"By {authors} {body(i)}")
+
+def make_model(tmp_path, pages):
+    model = BoilerplateModel(str(tmp_path / "boilerplate.json"))
+    for i, content in enumerate(pages):
+        model.update(f"https://www.esri.com/arcgis-blog/products/p{i}/", content)
+    return model
+
+def test_header_pattern_matches_byline_variants():
+    for authors in ("Emily Windahl", "Jeff Swain and Ling Tang and Sarmistha Chatterjee",
+                    "Yixuan 'Emily' Hu", "Sara Eddy, Jay Cary, and Mark R. Barker"):
+        header = HEADER_PATTERN.match(blog_page(1, authors=authors))
+        assert header and header.group(0).endswith(authors + " ")
+
+def test_strips_learned_header_but_keeps_body(tmp_path):
+    categories = ["Announcements", "Mapping", "Analytics", "Developers", "Data Management", "Indoor GIS"]
+    model = make_model(tmp_path, [blog_page(i, category) for i, category in enumerate(categories)])
+
+    stripped = model.strip("https://www.esri.com/arcgis-blog/products/new/", blog_page(7, "Transportation"))
+    assert stripped == body(7)
+
+def test_header_kept_until_domain_has_enough_pages(tmp_path):
+    model = make_model(tmp_path, [blog_page(i) for i in range(3)])
+    page = blog_page(4)
+    assert model.strip("https://www.esri.com/arcgis-blog/products/new/", page) == page
+
+def test_header_kept_when_few_pages_use_it(tmp_path):
+    pages = [f"Webinar overview {body(i)}" for i in range(8)] + [blog_page(9)]
+    model = make_model(tmp_path, pages)
+    page = blog_page(10)
+    assert model.strip("https://www.esri.com/arcgis-blog/products/new/", page).startswith("ArcGIS Blog")
+
+def test_header_counts_survive_save_and_load(tmp_path):
+    model = make_model(tmp_path, [blog_page(i) for i in range(6)])
+    model.save()
+    reloaded = BoilerplateModel(model.model_file)
+    assert reloaded.domains["www.esri.com"]["headers"] == 6
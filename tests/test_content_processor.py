@@ -0,0 +1,26 @@
+import threading
+
+from content_processor import BlogContentProcessor
+
+def test_each_thread_fetches_with_its_own_session():
+    processor = BlogContentProcessor(None, None)
+    sessions = {}
+    barrier = threading.Barrier(4)
+
+    def worker(name):
+        # Every thread holds its session at once, so none can be handed a finished thread's
+        barrier.wait()
+        sessions[name] = processor.session
+        assert processor.session is sessions[name]
+        barrier.wait()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(session) for session in sessions.values()}) == 4
+    assert processor.session is processor.session
+    assert processor.session not in sessions.values()
+    assert "Mozilla" in processor.session.headers["User-Agent"]
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+
+from data_store import DataStore, save_array
+
+def test_writes_replace_files_that_readers_have_mapped(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"))
+    assert data_store.save_many_blog_data([make_post(0), make_post(1)])
+    mapped = data_store.load_shard_embeddings(None, "voyage-test")
+    mapped_inode = os.stat(data_store.vectors_path(None, "voyage-test")).st_ino
+
+    assert data_store.save_many_blog_data([make_post(2)])
+
+    # The new matrix is a different file, so the open map still reads the old one
+    assert os.stat(data_store.vectors_path(None, "voyage-test")).st_ino != mapped_inode
+    assert np.array_equal(mapped, [[1.0, 0.0], [1.0, 1.0]])
+    assert data_store.load_shard_embeddings(None, "voyage-test").shape == (3, 2)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+def test_offsets_from_another_write_are_detected(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"))
+    assert data_store.save_many_blog_data([make_post(0), make_post(1)])
+    paths = data_store.ensure_columns(None)
+    assert [record["url"] for record in data_store.read_shard_records(None, [1])] == [make_post(1)["url"]]
+
+    offsets = np.load(paths["offsets"])
+    save_array(paths["offsets"], offsets + 1)
+    os.utime(paths["models"])
+    with pytest.raises(RuntimeError):
+        data_store.read_shard_records(None, [1])
+
+def test_count_records_without_loading(tmp_path, make_post):
+    for shard_by in (None, "month"):
+        store = DataStore(str(tmp_path / f"{shard_by}.json"), shard_by=shard_by)
+        store.save_many_blog_data([make_post(i) for i in range(4)])
+        assert store.count_records() == 4
+
+def test_shard_keys_skip_shards_outside_the_date_filter(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"), shard_by="month")
+    dates = ["2024-09-15", "2024-10-01", "2024-11-20"]
+    assert data_store.save_many_blog_data([make_post(i, date=date) for i, date in enumerate(dates)])
+
+    assert data_store.get_shard_keys() == ["2024-09", "2024-10", "2024-11"]
+    assert data_store.get_shard_keys("2024-10-01", "2024-10-31") == ["2024-10"]
+    assert data_store.get_shard_keys(start_date="2024-10-02") == ["2024-11"]
+
+def test_record_moves_shard_when_its_date_changes(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"), shard_by="month")
+    assert data_store.save_many_blog_data([make_post(0, date="2024-10-05"), make_post(1, date="2024-10-20")])
+
+    assert data_store.save_blog_data(make_post(0, date="2024-11-02", summary="Updated"))
+
+    manifest = data_store.load_manifest()
+    assert manifest["urls"][make_post(0)["url"]] == "2024-11"
+    assert manifest["shards"]["2024-10"]["count"] == 1
+    assert manifest["shards"]["2024-11"]["count"] == 1
+    assert [post["url"] for post in data_store.load_shard("2024-10")] == [make_post(1)["url"]]
+    assert data_store.load_shard("2024-11")[0]["summary"] == "Updated"
+    assert data_store.count_records() == 2
+    # The old shard's search columns no longer return the moved record
+    assert data_store.load_shard_embeddings("2024-10").shape[0] == 1
+    assert list(data_store.find_records([make_post(0)["url"]])) == [make_post(0)["url"]]
@@ -0,0 +1,62 @@
+import json
+
+from ai_interface import MAX_POST_CHARS
+from content_processor import BlogContentProcessor
+from ingest_ledger import IngestLedger
+
+URL = "https://www.esri.com/arcgis-blog/products/test/post/"
+
+def prepared(i=0):
+    return {"url": URL, "title": "Post", "date": "2024-11-05", "content": f"Body {i}", "content_hash": str(i)}
+
+def test_saves_append_only_changed_entries(tmp_path):
+    ledger = IngestLedger(str(tmp_path / "ledger.json"))
+    ledger.mark(URL, "fetched", prepared=prepared())
+    ledger.mark("https://example.com/other", "embedded")
+    ledger.mark_failed(URL, "Claude unavailable")
+
+    with open(ledger.ledger_file) as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line)["url"] for line in lines] == [URL, "https://example.com/other", URL]
+
+    reloaded = IngestLedger(ledger.ledger_file)
+    assert reloaded.entries == ledger.entries
+    assert reloaded.get(URL)["state"] == "failed"
+    assert reloaded.get(URL)["prepared"] == prepared()
+
+def test_journal_is_compacted_once_superseded_lines_dominate(tmp_path):
+    ledger = IngestLedger(str(tmp_path / "ledger.json"))
+    for attempt in range(150):
+        ledger.mark_failed(URL, f"attempt {attempt}")
+
+    with open(ledger.ledger_file) as f:
+        assert len(f.read().splitlines()) <= 102
+    assert IngestLedger(ledger.ledger_file).get(URL)["attempts"] == 150
+
+def test_truncated_last_line_is_skipped_and_rewritten(tmp_path):
+    ledger = IngestLedger(str(tmp_path / "ledger.json"))
+    ledger.mark(URL, "fetched", prepared=prepared())
+    with open(ledger.ledger_file, "a") as f:
+        f.write('{"url": "https://example.com/cut", "entry": {"st')
+
+    reloaded = IngestLedger(ledger.ledger_file)
+    assert set(reloaded.entries) == {URL}
+    reloaded.mark("https://example.com/next", "embedded")
+    assert set(IngestLedger(ledger.ledger_file).entries) == {URL, "https://example.com/next"}
+
+def test_ledgers_saved_as_one_json_object_are_migrated(tmp_path):
+    ledger_file = tmp_path / "ledger.json"
+    ledger_file.write_text(json.dumps({URL: {"state": "embedded", "attempts": 0}}, indent=2))
+
+    ledger = IngestLedger(str(ledger_file))
+    assert ledger.get(URL)["state"] == "embedded"
+    ledger.mark("https://example.com/next", "embedded")
+    assert set(IngestLedger(str(ledger_file)).entries) == {URL, "https://example.com/next"}
+
+def test_prepared_content_is_capped_at_what_claude_is_sent():
+    processor = BlogContentProcessor(None, None)
+    body = "word " * (MAX_POST_CHARS // 2)
+    html = f"<html><head><title>Long</title></head><body><article><p>{body}</p></article></body></html>"
+
+    post = processor.prepare_from_html(URL, html)
+    assert len(post["content"]) == MAX_POST_CHARS
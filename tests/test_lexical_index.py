@@ -0,0 +1,23 @@
+from lexical_index import LexicalIndex
+
+def test_add_missing_indexes_only_unindexed_posts(tmp_path, make_post):
+    index = LexicalIndex(str(tmp_path / "index"))
+    index.add_document(make_post(0))
+    index.save()
+
+    assert index.add_missing([make_post(0), make_post(1), make_post(2)]) == 2
+    assert index.document_count() == 3
+    assert index.add_missing([make_post(0), make_post(1), make_post(2)]) == 0
+    assert LexicalIndex(index.index_dir).document_count() == 3
+
+def test_unsaved_additions_are_recovered_on_next_run(tmp_path, make_post):
+    index = LexicalIndex(str(tmp_path / "index"))
+    for i in range(3):
+        index.add_document(make_post(i))
+        index.save_if_due(2)
+
+    # A run that stops here has saved the first two documents only
+    reloaded = LexicalIndex(index.index_dir)
+    assert reloaded.document_count() == 2
+    assert reloaded.add_missing([make_post(i) for i in range(3)]) == 1
+    assert [url for url, _ in reloaded.search("product 2")][0] == make_post(2)["url"]
@@ -0,0 +1,67 @@
+import pytest
+
+from data_store import DataStore, record_embeddings
+from reembedder import Reembedder
+
+class FakeEmbeddingService:
+    """Embeds each text as [len(text), 1.0, 0.0], failing after fail_after calls"""
+
+    def __init__(self, model="voyage-new", fail_after=None):
+        self.model = model
+        self.fail_after = fail_after
+        self.texts = []
+
+    def batch_generate_embeddings(self, texts, batch_size=50):
+        if self.fail_after is not None and len(self.texts) >= self.fail_after:
+            raise Exception("embedding service unavailable")
+        self.texts.append(list(texts))
+        return [[float(len(text)), 1.0, 0.0] for text in texts], self.model
+
+def stored(data_store):
+    return {record["url"]: record for record in data_store.load_all_data()}
+
+def test_interrupted_reembed_resumes_where_it_stopped(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"))
+    assert data_store.save_many_blog_data([make_post(i) for i in range(5)])
+
+    with pytest.raises(Exception):
+        Reembedder(FakeEmbeddingService(fail_after=1), data_store, batch_size=2).run()
+    assert sum("voyage-new" in record_embeddings(record) for record in stored(data_store).values()) == 2
+
+    service = FakeEmbeddingService()
+    assert Reembedder(service, data_store, batch_size=2).run() == 3
+    assert sum(len(texts) for texts in service.texts) == 3
+    assert all("voyage-new" in record_embeddings(record) for record in stored(data_store).values())
+    assert Reembedder(FakeEmbeddingService(), data_store).run() == 0
+
+def test_cutover_promotes_the_new_model_and_drops_the_old_one(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"), shard_by="month")
+    assert data_store.save_many_blog_data([make_post(i) for i in range(3)])
+    Reembedder(FakeEmbeddingService(), data_store).run()
+
+    assert data_store.cutover_embedding_model("voyage-new") == 3
+    for record in stored(data_store).values():
+        assert record["embeddingModel"] == "voyage-new"
+        assert record_embeddings(record) == {"voyage-new": record["embedding"]}
+    key = data_store.get_shard_keys()[0]
+    assert data_store.load_shard_models(key) == {"primary": "voyage-new", "models": {"voyage-new": 3}}
+
+def test_reingest_keeps_other_models_vectors_until_reembedded(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"))
+    assert data_store.save_many_blog_data([make_post(0), make_post(1)])
+    Reembedder(FakeEmbeddingService(), data_store).run()
+
+    # Re-ingesting with the old primary model: one post unchanged, one with a new summary
+    assert data_store.save_many_blog_data([make_post(0), make_post(1, summary="A rewritten summary")])
+    records = stored(data_store)
+    assert all("voyage-new" in record_embeddings(record) for record in records.values())
+    assert "staleEmbeddings" not in records[make_post(0)["url"]]
+    assert records[make_post(1)["url"]]["staleEmbeddings"] == ["voyage-new"]
+    assert data_store.load_shard_embeddings(None, "voyage-new").shape == (2, 3)
+
+    service = FakeEmbeddingService()
+    assert Reembedder(service, data_store).run() == 1
+    assert service.texts == [["A rewritten summary"]]
+    refreshed = stored(data_store)[make_post(1)["url"]]
+    assert "staleEmbeddings" not in refreshed
+    assert refreshed["embeddings"]["voyage-new"] == [float(len("A rewritten summary")), 1.0, 0.0]
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import config
+import main
+from data_store import DataStore
+from lexical_index import LexicalIndex
+from query_processor import QueryProcessor
+from retrieval_cache import RetrievalCache
+from retriever import Retriever
+
+def make_retriever(tmp_path):
+    data_store = DataStore(str(tmp_path / "blog_data.json"))
+    return Retriever(
+        QueryProcessor(SimpleNamespace(model="voyage-test")),
+        None,
+        LexicalIndex(str(tmp_path / "index")),
+        data_store,
+        cache=RetrievalCache(str(tmp_path / "retrieval_cache.json")),
+    )
+
+def test_store_write_invalidates_cached_rankings(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"))
+    index = LexicalIndex(str(tmp_path / "index"))
+    for i in range(2):
+        assert data_store.save_blog_data(make_post(i))
+        index.add_document(make_post(i))
+    index.save()
+
+    first = make_retriever(tmp_path).retrieve("raster analysis", top_n=5, mode="lexical")
+    assert len(first) == 2
+    version = data_store.get_corpus_version()
+
+    # Ingest stores the post and indexes it, as process and refresh do
+    assert data_store.save_blog_data(make_post(2))
+    index.add_document(make_post(2))
+    index.save()
+    assert data_store.get_corpus_version() == version + 1
+
+    retriever = make_retriever(tmp_path)
+    second = retriever.retrieve("raster analysis", top_n=5, mode="lexical")
+    assert sorted(p["url"] for p in second) == sorted(make_post(i)["url"] for i in range(3))
+    # Only the ranking from the current version survives the cache's pruning
+    assert [entry["corpus_version"] for entry in retriever.cache.rankings.values()] == [version + 1]
+
+def test_index_rebuild_invalidates_cached_lexical_rankings(tmp_path, monkeypatch, make_post):
+    monkeypatch.setattr(config, "STORAGE_FILE", str(tmp_path / "blog_data.json"))
+    monkeypatch.setattr(config, "LEXICAL_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(config, "SHARD_BY", None)
+
+    data_store = DataStore(config.STORAGE_FILE)
+    for i in range(3):
+        assert data_store.save_blog_data(make_post(i))
+    # An index that fell behind the store, as after a run stopped before saving
+    stale_index = LexicalIndex(config.LEXICAL_INDEX_DIR)
+    stale_index.add_document(make_post(0))
+    stale_index.save()
+
+    first = make_retriever(tmp_path).retrieve("raster analysis", top_n=5, mode="lexical")
+    assert [p["url"] for p in first] == [make_post(0)["url"]]
+
+    assert main.build_lexical_index()
+
+    second = make_retriever(tmp_path).retrieve("raster analysis", top_n=5, mode="lexical")
+    assert sorted(p["url"] for p in second) == sorted(make_post(i)["url"] for i in range(3))
+
+def test_lexical_mode_is_not_diversified(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"))
+    index = LexicalIndex(str(tmp_path / "index"))
+    for i in range(3):
+        assert data_store.save_blog_data(make_post(i))
+        index.add_document(make_post(i))
+
+    def diversify_posts(*args):
+        raise AssertionError("lexical rankings must not be re-ranked")
+
+    retriever = Retriever(
+        QueryProcessor(SimpleNamespace(model="voyage-test")),
+        SimpleNamespace(diversify_posts=diversify_posts),
+        index,
+        data_store,
+        diversity_candidates=50,
+    )
+    posts = retriever.retrieve("raster analysis", top_n=2, mode="lexical")
+    assert len(posts) == 2
+    assert retriever.diversity_settings("lexical") is None
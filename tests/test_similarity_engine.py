@@ -0,0 +1,119 @@
+import numpy as np
+
+from data_store import DataStore
+from similarity_engine import SimilarityEngine, maximal_marginal_relevance
+
+def cosine_matrix(vectors):
+    vectors = np.asarray(vectors, dtype=float)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, vectors @ vectors.T
+
+# Three close "what's new" posts (0-2) and one distinct post (3)
+VECTORS, SIMILARITY = cosine_matrix([
+    [1.0, 0.10, 0.0],
+    [1.0, 0.15, 0.0],
+    [1.0, 0.05, 0.1],
+    [0.2, 1.00, 0.0],
+])
+
+def test_mmr_with_lambda_one_keeps_relevance_order():
+    relevance = [0.70, 0.80, 0.60, 0.50]
+    assert maximal_marginal_relevance(relevance, SIMILARITY, 4, mmr_lambda=1.0) == [1, 0, 2, 3]
+
+def test_mmr_promotes_a_distinct_post_over_a_redundant_one():
+    relevance = [0.80, 0.79, 0.78, 0.70]
+    assert maximal_marginal_relevance(relevance, SIMILARITY, 2, mmr_lambda=0.5) == [0, 3]
+
+def test_mmr_drops_near_duplicates():
+    relevance = [0.80, 0.79, 0.78, 0.70]
+    selected = maximal_marginal_relevance(relevance, SIMILARITY, 4, mmr_lambda=1.0, duplicate_threshold=0.995)
+    assert selected == [0, 2, 3]
+
+def test_mmr_choice_does_not_depend_on_weak_candidates():
+    relevance = [0.62, 0.60, 0.58, 0.45]
+    before = maximal_marginal_relevance(relevance, SIMILARITY, 3)
+
+    # An unrelated, barely relevant candidate must not rescale the others' scores
+    similarity = np.zeros((5, 5))
+    similarity[:4, :4] = SIMILARITY
+    similarity[4, 4] = 1.0
+    after = maximal_marginal_relevance(relevance + [0.05], similarity, 3)
+    assert after == before
+
+def test_group_by_topic_orders_topics_by_their_best_ranked_post():
+    vectors, _ = cosine_matrix([
+        [1.0, 0.0], [0.0, 1.0], [0.95, 0.05], [0.05, 0.95], [0.9, 0.1],
+    ])
+    posts = [{"url": f"https://example.com/{i}"} for i in range(5)]
+    engine = SimilarityEngine(None, topic_clusters=2)
+
+    grouped = engine.group_by_topic(posts, vectors, [0, 1, 2, 3, 4])
+
+    # MMR order is kept within each topic
+    assert grouped == [0, 2, 4, 1, 3]
+    assert [posts[i]["topic"] for i in grouped] == [1, 1, 1, 2, 2]
+
+def test_diversify_reads_vectors_at_the_search_hits_positions(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"), shard_by="month")
+    for i, vector in enumerate(VECTORS):
+        assert data_store.save_blog_data(make_post(i, date=f"2024-{10 + i % 2}-01", embedding=vector.tolist()))
+
+    def locate_records(urls):
+        raise AssertionError("vectors must come from the hits' positions, not a URL scan")
+    data_store.locate_records = locate_records
+
+    engine = SimilarityEngine(data_store, mmr_lambda=0.3)
+    posts, positions = engine.find_similar_posts([1.0, 0.1, 0.0], top_n=4, model="voyage-test", with_positions=True)
+    vectors = engine.load_post_vectors(positions, "voyage-test")
+    expected = np.array([VECTORS[int(post["url"].rstrip("/")[-1])] for post in posts])
+    assert np.allclose(vectors, expected, atol=1e-6)
+
+    picked = engine.diversify_posts(posts, 2, positions, "voyage-test")
+    assert [post["url"] for post in picked] == [posts[0]["url"], make_post(3)["url"]]
+
+def corpus(make_post, size=40):
+    rng = np.random.default_rng(0)
+    return [
+        make_post(i, url=f"https://{'www' if i % 3 else 'community'}.esri.com/p{i}/",
+                  date=f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}", embedding=rng.standard_normal(8).tolist())
+        for i in range(size)
+    ]
+
+def test_sharded_and_unsharded_searches_agree(tmp_path, make_post):
+    posts = corpus(make_post)
+    query = np.random.default_rng(1).standard_normal(8)
+
+    results = {}
+    for shard_by in (None, "domain", "month", "domain_month"):
+        data_store = DataStore(str(tmp_path / f"{shard_by}.json"), shard_by=shard_by)
+        assert data_store.save_many_blog_data(posts)
+        engine = SimilarityEngine(data_store)
+        results[shard_by] = [
+            engine.find_similar_posts(query, top_n=7, start_date=start, end_date=end)
+            for start, end in ((None, None), ("2024-03-01", "2024-06-30"))
+        ]
+
+    for shard_by, result in results.items():
+        for posts, expected in zip(result, results[None]):
+            assert len(posts) == 7
+            assert [post["url"] for post in posts] == [post["url"] for post in expected], shard_by
+            # float32 matrices of different shapes may differ in the last bits
+            assert np.allclose([post["similarity_score"] for post in posts],
+                               [post["similarity_score"] for post in expected], atol=1e-5)
+
+def test_shards_outside_the_date_filter_are_not_opened(tmp_path, make_post):
+    data_store = DataStore(str(tmp_path / "blog_data.json"), shard_by="month")
+    assert data_store.save_many_blog_data(corpus(make_post))
+    opened = []
+    load_shard_embeddings = data_store.load_shard_embeddings
+
+    def record_open(key, model=None):
+        opened.append(key)
+        return load_shard_embeddings(key, model)
+    data_store.load_shard_embeddings = record_open
+
+    posts = SimilarityEngine(data_store).find_similar_posts(
+        np.ones(8), top_n=5, start_date="2024-03-01", end_date="2024-04-30"
+    )
+    assert sorted(opened) == ["2024-03", "2024-04"]
+    assert posts and all("2024-03-01" <= post["date"] <= "2024-04-30" for post in posts)
@@ -32,6 +32,10 @@ def generate_output_filename():
     """Generate an output filename with the current date."""
     return f"summary_{get_current_date_string()}.md"
 
+def estimate_tokens(text):
+    """Roughly estimate the Claude token count of a text (about 4 characters per token)"""
+    return len(text) // 4
+
 def parse_date(date_string):
     """Parse a date string in various formats."""
     try: